@@ -4,57 +4,283 @@ VERSION = (0, 0, 1, "alpha")
 __version__ = ".".join([str(k) for k in VERSION])
 
 
-from pprint import pprint
 import argparse
 import os
 import sys
-import re
-import subprocess
+import json
 from os.path import join as j
 
-from libs import create_dirs, get_packages_list, check_yes_no, clean_packages_names
+from libs import get_packages_list, check_yes_no
+from libs import settings
 
+# Stages import the modules they need themselves, so informational commands
+# start quickly
 
-sys.path.insert(0, os.getcwd())
-sys.path.insert(1, j(os.getcwd(), 'libs'))
+sys.path.insert(0, settings.ROOT)
+sys.path.insert(1, j(settings.ROOT, 'libs'))
 
 DEBUG = True
 
 
-if __name__ == "__main__":
-    from libs.terminate.prompt import query
-    #query("Python rocks? ",(True, False))
+def serve_command(argv):
+    from libs.scaffold import ScaffoldError
+    from libs.service import serve
+    parser = argparse.ArgumentParser(prog='LazyPony serve', description='Keep lazypony warm and serve scaffold requests on a Unix socket')
+    parser.add_argument('-s', '--socket', help='Socket path (default %s)' % settings.SOCKET, default=settings.SOCKET)
+    args = parser.parse_args(argv)
+    print "Serving on %s" % args.socket
+    try:
+        serve(args.socket)
+    except ScaffoldError, e:
+        print e
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+def submit_command(argv):
+    from pprint import pprint
+    from libs.scaffold import ScaffoldError
+    from libs.service import submit
+    parser = argparse.ArgumentParser(prog='LazyPony submit', description='Send a scaffold request to "lazypony serve"')
+    parser.add_argument('request', help='JSON file with the request, "-" for stdin')
+    parser.add_argument('-s', '--socket', help='Socket path (default %s)' % settings.SOCKET, default=settings.SOCKET)
+    args = parser.parse_args(argv)
+    request = json.load(args.request == '-' and sys.stdin or open(args.request))
+    # the server would resolve a relative path in its own working directory
+    if 'output_dir' in request:
+        request['output_dir'] = os.path.abspath(request['output_dir'])
+    try:
+        pprint(submit(args.socket, request))
+    except ScaffoldError, e:
+        print e
+        sys.exit(1)
 
-    packages = get_packages_list()
-    ipackages = []
+def startup_report_command(argv):
+    from libs.manifest import Manifest
+    from libs.startup import report, load_baseline, save_baseline
+    parser = argparse.ArgumentParser(prog='LazyPony startup-report', description='Time the imports of a generated project per app and package')
+    parser.add_argument('-d', '--output-dir', help='Project directory (default ".")', default='.', metavar='dest-dir')
+    parser.add_argument('-n', '--runs', help='Number of traced starts, the median is reported (default 3)', type=int, default=3)
+    parser.add_argument('--save-baseline', help='Store the result as the baseline to compare with', action="store_true", default=False)
+    args = parser.parse_args(argv)
+    output_dir = os.path.abspath(args.output_dir)
+    manifest = Manifest(output_dir)
+    if not manifest.exists():
+        parser.error('No lazypony project in "%s"' % output_dir)
 
-    parser = argparse.ArgumentParser(prog='LazyPony', description='Setting django environment with useful modules installed and integrated together')
+    try:
+        result = report(output_dir, j(settings.ROOT, 'packages'), manifest.packages, args.runs)
+    except RuntimeError, e:
+        print e
+        sys.exit(1)
+    baseline = load_baseline(output_dir) or {'total': None, 'apps': {}, 'packages': {}}
+
+    def show(name, seconds, before):
+        change = ''
+        if before:
+            change = "%+.0f%%" % ((seconds - before) * 100 / before)
+        print "%-45s %8.1fms %10s %8s" % (name, seconds * 1000,
+                                         before is not None and "%.1fms" % (before * 1000) or '-', change)
+
+    for title, key in (('App', 'apps'), ('Package', 'packages')):
+        print "%-45s %10s %10s %8s" % (title, 'time', 'baseline', 'change')
+        print "-" * 76
+        for seconds, name in sorted([(-t, n) for n, t in result[key].items()]):
+            show(name, -seconds, baseline[key].get(name))
+        print ""
+    show('Total', result['total'], baseline['total'])
+    for stage, error in sorted(result['errors'].items()):
+        print "%s didn't import: %s" % (stage, error)
+
+    if args.save_baseline:
+        save_baseline(output_dir, result)
+        print "Saved as the baseline"
+
+def history_command(argv):
+    from time import localtime, strftime
+    from libs.history import REGRESSION, History
+    parser = argparse.ArgumentParser(prog='LazyPony history', description='Show durations and cache hits of past runs and flag jobs which got slower')
+    parser.add_argument('-n', '--runs', help='Number of runs to show (default 10)', type=int, default=10)
+    parser.add_argument('-a', '--all', help='Show every job, not only regressions', action="store_true", default=False)
+    args = parser.parse_args(argv)
+    history = History(settings.HISTORY)
+
+    stages = ('render', 'write', 'check', 'fetch', 'install', 'precompile')
+    print "%-4s %-16s " % ('run', 'started') + " ".join(["%10s" % s for s in stages]) + "   cache hits  project"
+    print "-" * 132
+    for run in reversed(history.runs(args.runs)):
+        times = ["%9.1fs" % run['stages'][s] if s in run['stages'] else "%10s" % '-' for s in stages]
+        hits = " ".join(["%s %s/%s" % (kind[0], hits, hits + misses) for kind, (hits, misses) in sorted(run['cache'].items())])
+        print "%-4s %-16s " % (run['id'], strftime('%Y-%m-%d %H:%M', localtime(run['started']))) + \
+              " ".join(times) + "   %-10s  %s" % (hits, run['output_dir'] or '')
+
+    trends = [t for t in history.trends() if args.all or t['regression']]
+    if trends:
+        print ""
+        print "%-40s %10s %10s  %s" % ('job', 'latest', 'before', '')
+        print "-" * 132
+    for t in trends:
+        note = ''
+        if t['regression']:
+            note = "%.1fx slower" % (t['latest'] / t['previous'])
+            if t['revision'] != t['previous_revision']:
+                note += ", revision %s -> %s" % (t['previous_revision'], t['revision'])
+        print "%-40s %9.1fs %10s  %s" % (t['key'], t['latest'],
+                                         t['previous'] is not None and "%.1fs" % t['previous'] or '-', note)
+    if not args.all and not trends:
+        print ""
+        print "No job got %sx slower" % REGRESSION
+
+def verify_caches(scaffolder, full=False):
+    import time
+    from libs.cache import CacheManifest
+    started = time.time()
+    paths = [j(scaffolder.wheelhouse.path, w[1]) for wheels in scaffolder.wheelhouse.index.values() for w in wheels]
+    paths = [path for path in paths if os.path.exists(path)]
+    paths += scaffolder.source_cache.trees()
+    hashed, corrupt = 0, []
+    for path in paths:
+        result = CacheManifest(path).verify(full)
+        hashed += result['hashed']
+        if result['root'] is None:
+            corrupt.append(path)
+            print "Corrupt: %s (%s)" % (path, ", ".join(result['corrupt'][:5]))
+    print "Checked %s wheels and source trees in %.1fs, hashed %s files" % (len(paths), time.time() - started, hashed)
+    if corrupt:
+        print "%s corrupt entries are fetched again when they are needed" % len(corrupt)
+        sys.exit(1)
+
+def cache_command(argv):
+    import tarfile
+    from libs.bundle import export, unpack
+    from libs.lockfile import Lockfile
+    from libs.scaffold import Plan, Scaffolder, ScaffoldError
+    parser = argparse.ArgumentParser(prog='LazyPony cache', description='Move the source cache, wheelhouse and catalog index between nodes in one file')
+    commands = parser.add_subparsers(dest='command')
+    export_parser = commands.add_parser('export', help='Write a bundle')
+    export_parser.add_argument('bundle', help='Bundle file to write (.tar.gz)')
+    export_parser.add_argument('-l', '--lock', help='Project directory or %s to export the packages of, may be repeated' % settings.LOCK_NAME, action='append', default=[])
+    export_parser.add_argument('-i', '--install', help='Packages to export, with their dependencies', metavar='install-list')
+    export_parser.add_argument('--fetch', help='Fetch and build what the caches are missing first', action="store_true", default=False)
+    import_parser = commands.add_parser('import', help='Add what a bundle has and the caches don\'t')
+    import_parser.add_argument('bundle', help='Bundle file to read')
+    verify_parser = commands.add_parser('verify', help='Check every cached wheel and source tree against its manifest')
+    verify_parser.add_argument('--full', help='Hash every file, not only the ones whose size or mtime changed', action="store_true", default=False)
+    args = parser.parse_args(argv)
+
+    scaffolder = Scaffolder()
+    if args.command == 'verify':
+        verify_caches(scaffolder, args.full)
+        return
+    if args.command == 'import':
+        try:
+            added = unpack(args.bundle, scaffolder.wheelhouse, scaffolder.source_cache, settings.CATALOG_INDEX)
+        except (ValueError, IOError, tarfile.TarError), e:
+            print e
+            sys.exit(1)
+        print "Added %s wheels and %s source trees, skipped %s blobs already here" % (
+            len(added['wheels']), len(added['trees']), added['skipped'])
+        if added['corrupt']:
+            print "Corrupt blobs, not imported: %s" % ", ".join(added['corrupt'])
+            sys.exit(1)
+        return
+
+    plans = []
+    try:
+        for path in args.lock:
+            lockfile = Lockfile(os.path.isdir(path) and path or os.path.dirname(path))
+            if not lockfile.exists():
+                parser.error("No %s in %s" % (settings.LOCK_NAME, path))
+            plans.append(Plan.from_lockfile(lockfile))
+        if args.install:
+            plans.append(Plan.resolve(args.install.split(" ")))
+        if not plans:
+            parser.error("Nothing to export, give --lock or --install")
+        if args.fetch:
+            for plan in plans:
+                scaffolder.fetch(plan)
+    except ScaffoldError, e:
+        print e
+        sys.exit(1)
+
+    sources, digests = [], {}
+    for plan in plans:
+        sources += [(plan.sources[p], plan.sparse[p]) for p in plan.installable
+                    if (plan.sources[p], plan.sparse[p]) not in sources]
+        digests.update(plan.digests)
+    missing = export(args.bundle, sources, scaffolder.wheelhouse, scaffolder.source_cache, settings.CATALOG_INDEX,
+                     digests)
+    for req in missing:
+        print "Not in the caches, use --fetch: %s" % req
+    print "Exported %s packages to %s" % (len(sources) - len(missing), args.bundle)
+
+def cache_serve_command(argv):
+    from libs.peers import serve
+    from libs.scaffold import Scaffolder
+    parser = argparse.ArgumentParser(prog='LazyPony cache-serve', description='Serve the source cache and wheelhouse to other nodes listing this one in LAZYPONY_PEERS')
+    parser.add_argument('-b', '--bind', help='Address to listen on (default all)', default='')
+    parser.add_argument('-p', '--port', help='Port (default %s)' % settings.PEER_PORT, type=int, default=settings.PEER_PORT)
+    args = parser.parse_args(argv)
+    scaffolder = Scaffolder()
+    print "Serving %s and %s on port %s" % (settings.SOURCES, settings.WHEELHOUSE, args.port)
+    try:
+        serve((args.bind, args.port), scaffolder.wheelhouse.path, scaffolder.source_cache.path)
+    except KeyboardInterrupt:
+        pass
+
+def zipapp_command(argv):
+    from libs.catalog import CatalogIndex
+    from libs.zipapp import build
+    parser = argparse.ArgumentParser(prog='LazyPony zipapp', description='Build lazypony as a single executable zip file, run it with the python building it')
+    parser.add_argument('-o', '--output', help='File to write (default dist/lazypony.pyz)', default=j('dist', 'lazypony.pyz'))
+    args = parser.parse_args(argv)
+    catalog = CatalogIndex(j(settings.ROOT, 'packages'), settings.CATALOG_INDEX)
+    build_id = build(settings.ROOT, args.output, catalog.entries)
+    print "Built %s (%s)" % (args.output, build_id)
+
+COMMANDS = {
+    'serve': serve_command,
+    'submit': submit_command,
+    'startup-report': startup_report_command,
+    'history': history_command,
+    'cache': cache_command,
+    'cache-serve': cache_serve_command,
+    'zipapp': zipapp_command,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(prog='LazyPony', description='Setting django environment with useful modules installed and integrated together',
+                                     epilog='Commands: %s, see "<command> -h"' % ", ".join(sorted(COMMANDS)))
 
     parser.add_argument('-v', '--version', action='version', version='%(prog)s ' + __version__)
     parser.add_argument('-d', '--output-dir', help='Directory in which django file names will be created (default ".")', default='.', metavar='dest-dir')
     parser.add_argument('-i', '--install', help='List packegages to install', metavar='install-list')
-    parser.add_argument('-p', '--show-packages', help='Show all available packages', action='version', version=" ".join(packages) )
+    parser.add_argument('-p', '--show-packages', help='Show all available packages', action="store_true", default=False)
     parser.add_argument('-f', '--full', help='Install everything', action="store_true", default=False, dest="full_install")
+    parser.add_argument('-u', '--update', help='Update existing project, only changed files are rewritten', action="store_true", default=False)
+    parser.add_argument('--no-lock', help='Ignore %s and resolve packages again' % settings.LOCK_NAME, action="store_true", default=False)
 
     try:
         args = parser.parse_args()
     except IOError, msg:
         parser.error(str(msg))
 
-    try:    
-        pip_info = subprocess.Popen(['pip','--version'], stdout=subprocess.PIPE,).communicate()[0]
-        pip_version = re.search('pip (.*?) ', pip_info).group(1)
-        print pip_version
-    except:
-        print "pip not installed"
-        sys.exit(1)
-        
-    try:    
-        virtualenv_version = subprocess.Popen(['virtualenv','--version'], stdout=subprocess.PIPE,).communicate()[0]
-    except:
-        print "virtualenv not installed"        
-        sys.exit(1)
-            
+    if args.show_packages:
+        from libs.catalog import embedded
+        print " ".join(sorted(embedded() or get_packages_list()))
+        sys.exit()
+
+    from libs.terminate.prompt import query, multi_select
+    from libs.checkpoint import JOURNAL_NAME
+    from libs.databases import ENGINES
+    from libs.lockfile import Lockfile
+    from libs.scaffold import REQUIRED, Plan, Scaffolder, ScaffoldError, current_user, secret_key
+
     if args.output_dir == '.':
         var = raw_input("Create django project in '%s'? [Y/N] " % os.getcwd())
         if not check_yes_no(var):
@@ -66,117 +292,147 @@ if __name__ == "__main__":
     """
     if DEBUG:
         from shutil import rmtree
-        rmtree(j(os.getcwd(), 'testfolder'), True)
+        if not args.update and not os.path.exists(j(os.getcwd(), 'testfolder', JOURNAL_NAME)):
+            rmtree(j(os.getcwd(), 'testfolder'), True)
         args.output_dir = j(os.getcwd(), 'testfolder')
 
 
-    if not create_dirs(args.output_dir):
-        parser.error('Could\'t create directory "%s"' % args.output_dir)
-
+    scaffolder = Scaffolder()
+    journal = scaffolder.journal(args.output_dir)
+    resume = journal.exists()
+    if resume:
+        print "Resuming the scaffold interrupted in %s" % args.output_dir
+    try:
+        journal.tools = scaffolder.probe()
+    except ScaffoldError, e:
+        print e
+        sys.exit(1)
+    print journal.tools['pip']
 
-    def tofile(filename, string):
-        file = open("test.bin","w")
-        file.write(string)
-        file.close()
+    try:
+        manifest = scaffolder.prepare(args.output_dir, args.update, resume)
+    except ScaffoldError, e:
+        parser.error(str(e))
+    journal.save()
 
 
-    def mreplace(str, dt):
-        for key in dt:
-            str = str.replace("{{ %s }}" % key, dt[key])
-        return str
+    if journal.answers is not None:
+        manifest.answers = journal.answers
 
-    def template(filename_from, filename_to, dt):
-        string = open(filename_from,"r").read()
+    def ask(key, prompt, default=''):
+        """Prompts for an answer, in update mode empty input keeps the previous one.
+        A resumed scaffold keeps the answers it had."""
+        if journal.answers is not None:
+            return manifest.answers.setdefault(key, default)
+        if args.update and key in manifest.answers:
+            default = manifest.answers[key]
+            prompt = "%s [%s] " % (prompt, default)
+        manifest.answers[key] = raw_input(prompt).strip() or default
+        return manifest.answers[key]
 
-        file = open(filename_to,"w")
-        file.write(mreplace(string, dt))
-        file.close()
-        
 
-    username = os.environ["USERNAME"] if "USERNAME" in os.environ else os.environ["USER"]
+    username = current_user()
     print ("Generating separated configs for production enviroment and user \"%s\"" % username)
-    var = raw_input("Enter comma-separated usernames if you need additional configs or leave empty:")
-
-    var_timezone = raw_input("Enter TIME_ZONE (empty for default Europe/Moscow):")
-    var_language = raw_input("Enter LANGUAGE_CODE (empty for default ru-ru):")
-
-    base_settings = j(args.output_dir, 'project', "settings.py")
-    user_settings = j(args.output_dir, 'project', "settings_%s.py" % (username,))
-    production_settings = j(args.output_dir, 'project',"settings_production.py")
-
-    template(j(os.getcwd(), 'res', 'user_settings.py'), user_settings, [])
-    template(j(os.getcwd(), 'res', 'user_settings.py'), production_settings, [])
-
-    additional_usernames = var.strip().split(",")
-    for username in additional_usernames:
-        user_settings = j(args.output_dir, 'project', "settings_%s.py" % (username,))
-        template(j(os.getcwd(), 'res', 'user_settings.py'), user_settings, [])
-
-    template(j(os.getcwd(), 'res', 'base_settings.py'), base_settings, {'document_root' : args.output_dir+os.sep})
-
-    if args.full_install:
-        ipackages = packages
-    elif args.install is None:
-        for p in packages:
-            if p == 'django': continue
-            var = raw_input( "Install '%s'? [Y/N] " % p )
-            if check_yes_no(var): ipackages.append(p)
+    ask('usernames', "Enter comma-separated usernames if you need additional configs or leave empty:")
+
+    ask('time_zone', "Enter TIME_ZONE (empty for default Europe/Moscow):", 'Europe/Moscow')
+    ask('language_code', "Enter LANGUAGE_CODE (empty for default ru-ru):", 'ru-ru')
+
+    ask('site_http', "Enter production site url (empty for default http://example.com/):", 'http://example.com/')
+
+    engine = ask('db_engine', "Enter database engine, one of %s (empty for default postgresql_psycopg2):" % ", ".join(ENGINES), 'postgresql_psycopg2')
+    while engine not in ENGINES:
+        engine = ask('db_engine', "Unknown engine, enter one of %s:" % ", ".join(ENGINES), 'postgresql_psycopg2')
+    ask('db_name', "Enter database name, development ones get _<username> appended (empty for default project):", 'project')
+    if engine != 'sqlite3':
+        ask('db_user', "Enter database user:")
+        ask('db_password', "Enter database password:")
+        ask('db_host', "Enter database host (empty for localhost):")
+        ask('db_port', "Enter database port (empty for default):")
+        ask('db_pooler', "Enter host:port of a connection pooler like pgbouncer, or leave empty:")
+
+    manifest.answers.setdefault('secret_key', secret_key())
+    journal.answers = manifest.answers
+    journal.save()
+
+    lockfile = Lockfile(args.output_dir)
+    if journal.plan is not None:
+        plan = Plan.from_dict(journal.plan)
+    elif lockfile.exists() and not args.no_lock:
+        print "Using %s" % lockfile.filename
+        plan = Plan.from_lockfile(lockfile)
     else:
-        ipackages = args.install.split(" ")
+        if args.full_install:
+            ipackages = get_packages_list()
+        elif args.install is None:
+            index = scaffolder.catalog
+            ipackages = multi_select("Select packages to install:", [p for p in index.names() if p not in REQUIRED],
+                                     index.search, settings.PRESETS, args.update and manifest.packages or ())
+        else:
+            ipackages = args.install.split(" ")
+
+        if args.update:
+            ipackages += [p for p in manifest.packages if p not in ipackages]
+
+        try:
+            plan = Plan.resolve(ipackages)
+        except ScaffoldError, e:
+            parser.error(str(e))
 
-    ipackages = clean_packages_names(ipackages)
+    journal.plan = plan.as_dict()
+    journal.save()
 
-    #Collect dependencies
-    deps = {}
-    deps_l = set()
-    for p in ipackages:
+    if not journal.done('write'):
         try:
-            d = __import__('packages.%s.dependencies' % p, globals(), locals(), 'DEPENDENCIES', -1)
-            deps[p] = d.DEPENDENCIES
-            if not isinstance(d.DEPENDENCIES, str):
-                for i in d.DEPENDENCIES:
-                    deps_l.add(i)
-                continue
-            deps_l.add(d.DEPENDENCIES)
-        except ImportError:
-            parser.error('Could\'t find packages "%s"' % p)
-
-    ipackages.insert(0, 'django')
-    deps_l = [i for i in deps_l if i not in ipackages]
+            rendered, variants = scaffolder.render(args.output_dir, manifest.answers, plan.names)
+            written, removed, edited = scaffolder.write(manifest, rendered)
+        except ScaffoldError, e:
+            print e
+            sys.exit(1)
+        journal.complete('write', {'variants': variants, 'written': written,
+                                   'removed': removed, 'edited': edited})
+
+    if not journal.done('check'):
+        print "Checking settings"
+        journal.complete('check', scaffolder.check(args.output_dir, journal.stages['write']['variants']))
+
+    def show(p):
+        source = plan.sources[p] or (None, 'ships with django', None, '-')
+        print "%-21s    %-20s    %s" % (p, source[3], source[1])
 
     print ""
     print "Installing:"
     print "------------------------------------------------------------------------------------------------------------------------------------"
-    for p in ipackages:
-        d = __import__('packages.%s.source' % p, globals(), locals(), 'SOURCE', -1)
-        print "%-21s    %-20s    %s" % (p, d.SOURCE[3], d.SOURCE[1])
+    for p in plan.packages:
+        show(p)
 
-    if deps_l:
+    if plan.dependencies:
         print ""
         print "Installing for dependencies:"
         print "------------------------------------------------------------------------------------------------------------------------------------"
-        for p in deps_l:
-            d = __import__('packages.%s.source' % p, globals(), locals(), 'SOURCE', -1)
-            print "%-21s    %-20s    %s" % (p, d.SOURCE[3], d.SOURCE[1])
+        for p in plan.dependencies:
+            show(p)
 
     print ""
     print "Transaction Summary"
     print "===================================================================================================================================="
-    print "Install      %s Package(s)" % (len(ipackages) + len(deps_l))
-    var = raw_input( "Is this ok? [Y/N] " )
-    if not check_yes_no(var):
-        print "Aborted"
-        sys.exit()
-
-
-    print "Generating requerements.pip file"
-    for d in deps_l:
-        print "%-21s    %-20s    %s" % (p, d.SOURCE[3], d.SOURCE[1])
-
-
-    for p in ipackages:
-        #print "%-21s    %-20s    %s" % (d.SOURCE[3], d.SOURCE[1])
-        d = __import__('packages.%s.source' % p, globals(), locals(), 'SOURCE', -1)
-        print "-e %s+%s#%segg=%s" % (d.SOURCE[0], d.SOURCE[1], d.SOURCE[3], d.SOURCE[2])
-        #print "%-21s    %-20s    %s" % (p, d.SOURCE[3], d.SOURCE[1])
+    print "Install      %s Package(s)" % len(plan.names)
+    if not journal.done('confirm'):
+        var = raw_input( "Is this ok? [Y/N] " )
+        if not check_yes_no(var):
+            journal.remove()
+            print "Aborted"
+            sys.exit()
+        journal.complete('confirm')
 
+    if not journal.done('install'):
+        try:
+            journal.complete('install', scaffolder.install(args.output_dir, plan, manifest, lockfile, journal))
+        except ScaffoldError, e:
+            print e
+            print "Run lazypony again to resume from here"
+            sys.exit(1)
+
+    print "Compiling"
+    scaffolder.precompile(args.output_dir)
+    journal.remove()
@@ -2,7 +2,9 @@
 import os
 from os.path import join as j
 
-def create_dirs(base_path):
+import settings
+
+def create_dirs(base_path, update=False):
     dirs = [
         'project',
         'media',
@@ -14,7 +16,8 @@ def create_dirs(base_path):
     ]
 
     try:
-        for dir in dirs:            
+        for dir in dirs:
+            if update and os.path.isdir(j(base_path, dir)): continue
             os.makedirs( j(base_path, dir) )
     except:
         return False
@@ -24,7 +27,7 @@ def create_dirs(base_path):
 def get_packages_list():
     modList = []
     modNames = {}
-    _myDir = j(os.getcwd(), 'packages')
+    _myDir = j(settings.ROOT, 'packages')
 
     for ii in os.walk(_myDir):
         if ii[0] == _myDir:
@@ -42,4 +45,31 @@ def check_yes_no(var):
     return False
 
 def clean_packages_names(p):
-    return [r.lower().strip() for r in p]
\ No newline at end of file
+    return [r.lower().strip() for r in p]
+
+def get_source(name):
+    return __import__('packages.%s.source' % name, {}, {}, ['SOURCE']).SOURCE
+
+def get_dependencies(name):
+    d = __import__('packages.%s.dependencies' % name, {}, {}, ['DEPENDENCIES']).DEPENDENCIES
+    if isinstance(d, basestring):
+        return (d,)
+    return tuple(d)
+
+def get_sparse(name):
+    return getattr(__import__('packages.%s.source' % name, {}, {}, ['SOURCE']), 'SPARSE', ())
+
+def get_dev_only(name):
+    return getattr(__import__('packages.%s' % name, {}, {}, ['DEV_ONLY']), 'DEV_ONLY', False)
+
+def get_positions(name):
+    module = __import__('packages.%s' % name, {}, {}, ['FIRST', 'LAST'])
+    return tuple(getattr(module, 'FIRST', ())), tuple(getattr(module, 'LAST', ()))
+
+def get_order(name):
+    return getattr(__import__('packages.%s' % name, {}, {}, ['ORDER']), 'ORDER', {})
+
+def get_layout(name):
+    """What rendering needs of a package, read from its __init__ only."""
+    first, last = get_positions(name)
+    return {'dev_only': get_dev_only(name), 'first': list(first), 'last': list(last), 'order': get_order(name)}
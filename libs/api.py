@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Python API for scaffolding projects in-process
+
+Every stage is a function taking plain data (names, dictionaries, paths) and
+returning plain, JSON serializable results, so a provisioning system can drive
+lazypony without spawning it and scripting its prompts::
+
+    from libs import api
+
+    plan = api.plan(['south', 'django-mptt'])
+    files = api.render('/srv/site', {'time_zone': 'UTC'}, plan)
+    api.write('/srv/site', files)
+    api.fetch(plan)
+    api.install('/srv/site', plan)
+    api.precompile('/srv/site')
+
+The functions share one ``Scaffolder``, so the catalog index, toolchain
+probes, caches and timings are loaded once per process and reused by every
+project. Failures raise ScaffoldError.
+"""
+import os
+
+from lockfile import Lockfile
+from scaffold import Plan, Scaffolder, ScaffoldError, secret_key
+
+__all__ = ['ScaffoldError', 'scaffolder', 'catalog', 'plan', 'render', 'write',
+           'check', 'fetch', 'install', 'precompile', 'scaffold']
+
+_scaffolder = None
+
+
+def scaffolder(root=None, log=None):
+    """The shared Scaffolder, created on first use.
+
+    ``log`` replaces the progress callable, lines are printed by default.
+    """
+    global _scaffolder
+    if _scaffolder is None:
+        _scaffolder = Scaffolder(root, log)
+    elif log is not None:
+        _scaffolder.log = log
+    return _scaffolder
+
+
+def _plan(plan):
+    return isinstance(plan, Plan) and plan or Plan.from_dict(plan)
+
+
+def catalog(query=None):
+    """Catalog entries by package name, the ones matching ``query`` if given."""
+    index = scaffolder().catalog
+    names = query and index.search(query) or index.names()
+    return dict((name, index.entries[name]) for name in names)
+
+
+def plan(packages, output_dir=None):
+    """Resolved plan for the catalog ``packages`` as a dictionary.
+
+    With ``output_dir`` holding a lockfile the locked plan is returned
+    instead.
+    """
+    if output_dir is not None:
+        lockfile = Lockfile(output_dir)
+        if lockfile.exists():
+            return Plan.from_lockfile(lockfile).as_dict()
+    return Plan.resolve(packages).as_dict()
+
+
+def render(output_dir, answers={}, plan=None):
+    """Project files for ``answers`` and the packages of ``plan``, nothing
+    is written.
+
+    Returns ``files`` (relative path -> content), the settings ``variants``
+    and the ``answers`` used, including a generated secret key.
+    """
+    answers = dict(answers)
+    answers.setdefault('secret_key', secret_key())
+    packages = plan and _plan(plan).names or ('django',)
+    files, variants = scaffolder().render(os.path.abspath(output_dir), answers, packages)
+    return {'files': files, 'variants': variants, 'answers': answers}
+
+
+def write(output_dir, rendered, update=False):
+    """Writes the output of ``render``, hand edited files are kept.
+
+    Returns the ``written``, ``removed`` and ``edited`` paths.
+    """
+    s = scaffolder()
+    manifest = s.prepare(output_dir, update)
+    manifest.answers.update(rendered['answers'])
+    written, removed, edited = s.write(manifest, rendered['files'])
+    return {'written': written, 'removed': removed, 'edited': edited}
+
+
+def check(output_dir, variants):
+    """Names of the settings variants which don't import."""
+    return scaffolder().check(output_dir, variants)
+
+
+def fetch(plan):
+    """Fetches the sources of ``plan`` and builds their wheels into the cache."""
+    return scaffolder().fetch(_plan(plan))
+
+
+def install(output_dir, plan):
+    """Installs ``plan`` into the virtualenv of the project in ``output_dir``."""
+    s = scaffolder()
+    s.probe()
+    return s.install(output_dir, _plan(plan))
+
+
+def precompile(output_dir):
+    """Byte-compiles the project, see ``libs.precompile.precompile``."""
+    return scaffolder().precompile(output_dir)
+
+
+def scaffold(output_dir, packages=(), answers={}, update=False, use_lock=True):
+    """Every stage at once, see ``Scaffolder.scaffold``."""
+    return scaffolder().scaffold(os.path.abspath(output_dir), packages, answers, update, use_lock)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""Cache bundles for build nodes without network access
+
+A bundle is a gzipped tar holding ``manifest.json`` first and then every
+distinct file once, as ``blobs/<sha256>``. The manifest lists the wheels
+(requirement line -> file name and hash), the source trees (directory name
+-> relative path -> hash, mode or symlink target) and the catalog index.
+
+Importing reads the manifest, works out which wheels and trees the node is
+missing and only extracts the blobs those need, checking every blob against
+its name. Trees are assembled in a ``.part`` directory and renamed, like
+fetched ones. Bundles, like the indexes of cache peers, come from other
+machines: names and paths in them are checked to stay inside the caches
+before anything is written.
+"""
+import os
+import re
+import json
+import shutil
+import tarfile
+import hashlib
+import posixpath
+from os.path import join as j
+from StringIO import StringIO
+
+from cache import CacheManifest
+from wheelhouse import requirement
+
+__all__ = ['MANIFEST', 'check_wheel', 'check_tree', 'tree_entries', 'assemble', 'export', 'unpack']
+
+MANIFEST = 'manifest.json'
+
+CHUNK_SIZE = 1024 * 1024
+
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _check_name(name, kind):
+    if not isinstance(name, basestring) or name in ('', '.', '..') or \
+       '/' in name or os.sep in name or '\0' in name:
+        raise ValueError("Unsafe %s name: %r" % (kind, name))
+
+
+def check_wheel(wheel):
+    """Raises ValueError unless a listed wheel has a plain file name and a sha256."""
+    _check_name(wheel.get('name'), 'wheel')
+    if not SHA256.match(str(wheel.get('sha256'))):
+        raise ValueError("Invalid hash of wheel %s: %r" % (wheel['name'], wheel.get('sha256')))
+
+
+def check_tree(name, entries):
+    """Raises ValueError unless tree ``name`` and its ``entries`` stay in the cache.
+
+    Paths have to be relative without ``..`` and not lead through a
+    symlink, symlinks have to point inside the tree and files need a sha256.
+    """
+    _check_name(name, 'tree')
+    links = set([relative for relative, entry in entries.items() if 'link' in entry])
+    for relative, entry in entries.items():
+        parts = relative.split('/')
+        if [p for p in parts if p in ('', '.', '..')] or '\0' in relative or os.sep != '/' and os.sep in relative:
+            raise ValueError("Unsafe path in tree %s: %r" % (name, relative))
+        if [i for i in range(1, len(parts)) if '/'.join(parts[:i]) in links]:
+            raise ValueError("Path through a symlink in tree %s: %r" % (name, relative))
+        if 'link' in entry:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(relative), entry['link']))
+            if posixpath.isabs(entry['link']) or target == '..' or target.startswith('../'):
+                raise ValueError("Symlink leaving tree %s: %r -> %r" % (name, relative, entry['link']))
+        elif not SHA256.match(str(entry.get('sha256'))):
+            raise ValueError("Invalid hash in tree %s: %r" % (name, relative))
+
+
+def tree_entries(path):
+    """Relative path -> hash, size and mode or {'link': target} of a tree.
+
+    Hashes come from the tree's manifest, None is returned when the tree
+    is corrupt.
+    """
+    manifest = CacheManifest(path)
+    if manifest.verify()['root'] is None:
+        return None
+    hashes = manifest.load()
+    entries = {}
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            filename = j(root, name)
+            relative = os.path.relpath(filename, path).replace(os.sep, '/')
+            if os.path.islink(filename):
+                entries[relative] = {'link': os.readlink(filename)}
+            elif os.path.isfile(filename):
+                entries[relative] = {'sha256': hashes[relative][0],
+                                     'size': hashes[relative][1],
+                                     'mode': os.stat(filename).st_mode & 0777}
+    return entries
+
+
+def export(filename, sources, wheelhouse, source_cache, catalog_file=None, digests={}):
+    """Writes the bundle of ``sources``, given as (SOURCE, sparse) pairs.
+
+    ``digests`` maps requirement lines to locked wheel hashes, those
+    wheels are exported rather than the latest ones. Returns the requirement lines which had neither a wheel nor a tree to
+    export.
+    """
+    manifest = {'wheels': {}, 'trees': {}, 'catalog': None}
+    blobs = {}
+    missing = []
+    for source, sparse in sources:
+        wheel = wheelhouse.wheel(source, digests.get(requirement(source)))
+        tree = source_cache.cached(source, sparse)
+        if wheel is None and tree is None:
+            missing.append(requirement(source))
+        if wheel is not None:
+            digest = wheelhouse.digest(wheel)
+            blobs[digest] = wheel
+            manifest['wheels'][requirement(source)] = {'name': os.path.basename(wheel), 'sha256': digest}
+        entries = tree is not None and tree_entries(tree)
+        if entries:
+            for relative, entry in entries.items():
+                if 'sha256' in entry:
+                    blobs[entry['sha256']] = j(tree, relative)
+            manifest['trees'][os.path.basename(tree)] = entries
+    if catalog_file and os.path.exists(catalog_file):
+        manifest['catalog'] = json.load(open(catalog_file))
+
+    bundle = tarfile.open(filename, 'w:gz')
+    try:
+        data = json.dumps(manifest, sort_keys=True)
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(data)
+        bundle.addfile(info, StringIO(data))
+        for digest, path in sorted(blobs.items()):
+            bundle.add(path, 'blobs/%s' % digest, recursive=False)
+    finally:
+        bundle.close()
+    return missing
+
+
+def assemble(tree, entries, blob):
+    """Builds ``tree`` from ``entries`` of ``tree_entries``.
+
+    ``blob`` returns the file holding a hash. The tree is built in a
+    ``.part`` directory which is renamed when complete.
+    """
+    part = tree + '.part'
+    CacheManifest(tree).remove()
+    shutil.rmtree(part, True)
+    os.makedirs(part)
+    for relative, entry in sorted(entries.items()):
+        target = j(part, *relative.split('/'))
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        if 'link' in entry:
+            os.symlink(entry['link'], target)
+        else:
+            shutil.copyfile(blob(entry['sha256']), target)
+            os.chmod(target, entry['mode'] & 0777)
+    os.rename(part, tree)
+
+
+def _extract(member, stream, target):
+    """Copies a blob to ``target``, returns whether its hash matches its name."""
+    digest = hashlib.sha256()
+    file = open(target, 'wb')
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+            file.write(chunk)
+    finally:
+        file.close()
+    return digest.hexdigest() == member.name.split('/', 1)[1]
+
+
+def _blob(member):
+    """Hash a blob member is named by, raises ValueError for anything else."""
+    prefix, _, digest = member.name.partition('/')
+    if prefix != 'blobs' or not SHA256.match(digest) or not member.isfile():
+        raise ValueError("Malformed bundle member: %s" % member.name)
+    return digest
+
+
+def unpack(filename, wheelhouse, source_cache, catalog_file=None, staging=None):
+    """Adds the wheels and trees of the bundle the caches don't have yet.
+
+    Returns the names of the ``wheels`` and ``trees`` added, the number of
+    blobs ``skipped`` and the ones which were ``corrupt``.
+    """
+    staging = staging or j(source_cache.path, '.import')
+    shutil.rmtree(staging, True)
+    os.makedirs(staging)
+    bundle = tarfile.open(filename, 'r|gz')
+    try:
+        members = iter(bundle)
+        first = members.next()
+        if first.name != MANIFEST:
+            raise ValueError("%s is not a lazypony cache bundle" % filename)
+        manifest = json.load(bundle.extractfile(first))
+        for wheel in manifest['wheels'].values():
+            check_wheel(wheel)
+        for name, entries in manifest['trees'].items():
+            check_tree(name, entries)
+
+        wheels = dict((req, wheel) for req, wheel in manifest['wheels'].items()
+                      if wheel['sha256'] not in [w[0] for w in wheelhouse.wheels(req)])
+        trees = dict((name, entries) for name, entries in manifest['trees'].items()
+                     if not os.path.isdir(j(source_cache.path, name)))
+        needed = set([w['sha256'] for w in wheels.values()])
+        for entries in trees.values():
+            needed.update([e['sha256'] for e in entries.values() if 'sha256' in e])
+
+        skipped, corrupt = 0, []
+        for member in members:
+            digest = _blob(member)
+            if digest not in needed:
+                skipped += 1
+                continue
+            if not _extract(member, bundle.extractfile(member), j(staging, digest)):
+                os.remove(j(staging, digest))
+                corrupt.append(digest)
+    finally:
+        bundle.close()
+
+    added = {'wheels': [], 'trees': [], 'skipped': skipped, 'corrupt': corrupt}
+    for req, wheel in sorted(wheels.items()):
+        if os.path.exists(j(staging, wheel['sha256'])):
+            wheelhouse.add(req, j(staging, wheel['sha256']), wheel['name'])
+            added['wheels'].append(wheel['name'])
+    wheelhouse.save()
+
+    for name, entries in sorted(trees.items()):
+        blobs = [e['sha256'] for e in entries.values() if 'sha256' in e]
+        if [b for b in blobs if not os.path.exists(j(staging, b))]:
+            continue
+        assemble(j(source_cache.path, name), entries, lambda digest: j(staging, digest))
+        added['trees'].append(name)
+
+    if catalog_file and manifest['catalog'] and not os.path.exists(catalog_file):
+        file = open(catalog_file, "w")
+        json.dump(manifest['catalog'], file)
+        file.close()
+    shutil.rmtree(staging, True)
+    return added
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Content hashing for cached source trees and wheels
+
+Every cached tree and wheel gets a manifest in the ``.manifests`` directory
+next to it, holding the hash, size and modification time of each file and
+the root hash over them, which is the ``tree_digest`` of a tree and the
+``file_digest`` of a wheel. The first check hashes everything; later ones
+only stat the files and re-hash those whose size or modification time
+changed, so a cache is checked in the time it takes to walk it. Cached
+files never change once in place: a re-hashed file whose hash differs from
+the recorded one, or a file missing or added, means the entry is corrupt.
+
+Files are hashed from memory maps by a thread pool, ``hashlib`` releases the
+interpreter lock while it digests.
+"""
+import os
+import json
+import mmap
+import hashlib
+
+__all__ = ['file_digest', 'tree_digest', 'hash_files', 'CacheManifest']
+
+CHUNK_SIZE = 1024 * 1024
+
+# Files adding up to fewer bytes than this are hashed without a thread pool
+PARALLEL_SIZE = 4 * CHUNK_SIZE
+
+MANIFESTS = '.manifests'
+
+
+def file_digest(filename):
+    """sha256 of a file, read from a memory map so wheels don't end up in memory"""
+    digest = hashlib.sha256()
+    file = open(filename, "rb")
+    try:
+        size = os.fstat(file.fileno()).st_size
+        if size:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(0, size, CHUNK_SIZE):
+                    digest.update(buffer(data, offset, CHUNK_SIZE))
+            finally:
+                data.close()
+    finally:
+        file.close()
+    return digest.hexdigest()
+
+
+def _files(path):
+    """(relative path, filename) of a tree in ``tree_digest`` order, or of a single file."""
+    if not os.path.isdir(path):
+        yield os.path.basename(path), path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            filename = os.path.join(root, name)
+            yield os.path.relpath(filename, path).replace(os.sep, '/'), filename
+
+
+def _root(hashes):
+    digest = hashlib.sha256()
+    for relative, sha256 in hashes:
+        digest.update("%s %s\n" % (sha256, relative))
+    return digest.hexdigest()
+
+
+def tree_digest(path):
+    """sha256 over relative paths and contents of every file in a tree"""
+    return _root([(relative, file_digest(filename)) for relative, filename in _files(path)])
+
+
+def _hash(filename):
+    try:
+        return filename, file_digest(filename)
+    except (IOError, OSError, ValueError):
+        return filename, None
+
+
+def hash_files(filenames, size=None, workers=None):
+    """Filename -> sha256, None for files which can't be read.
+
+    ``size`` is the total number of bytes, when it is large enough the
+    files are hashed in parallel.
+    """
+    if size is not None and size < PARALLEL_SIZE or len(filenames) < 2:
+        return dict(map(_hash, filenames))
+    import multiprocessing
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(workers or multiprocessing.cpu_count())
+    try:
+        return dict(pool.imap_unordered(_hash, filenames, 8))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class CacheManifest(object):
+    """Manifest of the tree or wheel at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.join(os.path.dirname(path), MANIFESTS, os.path.basename(path) + '.json')
+
+    def load(self):
+        """Relative path -> [sha256, size, mtime] recorded, None without a manifest."""
+        try:
+            return json.load(open(self.filename))['files']
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def save(self, files, root):
+        directory = os.path.dirname(self.filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        file = open(self.filename + '.tmp', "w")
+        json.dump({'root': root, 'files': files}, file, sort_keys=True)
+        file.close()
+        os.rename(self.filename + '.tmp', self.filename)
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def verify(self, full=False, workers=None):
+        """Checks the files against the manifest, recording it the first time.
+
+        Only files whose size or modification time changed are hashed
+        unless ``full`` is set. Returns the ``root`` hash (None when the
+        entry is corrupt), the number of files ``hashed`` and the relative
+        paths which are ``corrupt``.
+        """
+        recorded = self.load()
+        first = recorded is None
+        recorded = recorded or {}
+        files, stale, corrupt, size = {}, {}, [], 0
+        order = []
+        for relative, filename in _files(self.path):
+            order.append(relative)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                corrupt.append(relative)
+                continue
+            entry = recorded.get(relative)
+            if entry is None and not first:
+                corrupt.append(relative)
+            elif full or entry is None or entry[1:] != [stat.st_size, stat.st_mtime]:
+                stale[filename] = relative
+                size += stat.st_size
+            files[relative] = [entry and entry[0], stat.st_size, stat.st_mtime]
+        corrupt += [r for r in recorded if r not in files and r not in corrupt]
+
+        for filename, sha256 in hash_files(stale.keys(), size, workers).items():
+            relative = stale[filename]
+            if sha256 is None or not first and sha256 != files[relative][0]:
+                corrupt.append(relative)
+            files[relative][0] = sha256
+
+        result = {'root': None, 'hashed': len(stale), 'corrupt': sorted(corrupt)}
+        if not corrupt:
+            if os.path.isdir(self.path):
+                result['root'] = _root([(relative, files[relative][0]) for relative in order])
+            else:
+                result['root'] = files[order[0]][0]
+            if first or stale:
+                self.save(files, result['root'])
+        return result
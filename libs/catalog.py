@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Search index over the package catalog
+
+For every package the index keeps its source, dependencies, the apps it
+adds to ``INSTALLED_APPS`` and whether it is only meant for development.
+It is cached on disk and only rebuilt when a file in the catalog changes,
+so searching hundreds of packages imports nothing.
+The zipapp carries the index it was built with as ``libs/catalog.json``.
+"""
+import os
+import re
+import json
+from os.path import join as j
+
+from libs import get_packages_list, get_source, get_dependencies, get_layout
+
+__all__ = ['EMBEDDED', 'settings_names', 'embedded', 'CatalogIndex']
+
+# Index embedded in the zipapp, next to this module
+EMBEDDED = 'catalog.json'
+
+_STRING = re.compile(r'''['"]([^'"]+)['"]''')
+
+
+def settings_names(filename, setting):
+    """Strings listed in ``setting`` of a settings fragment.
+
+    The fragment is not executed: fragments may refer to names of the
+    generated settings (``PRODUCTION``, ``DEBUG``) which don't exist here.
+    """
+    if not os.path.exists(filename):
+        return []
+    match = re.search(r'^%s\s*=\s*[\(\[](.*?)[\)\]]' % setting, open(filename).read(), re.M | re.S)
+    if match is None:
+        return []
+    lines = [l.split('#', 1)[0] for l in match.group(1).splitlines()]
+    return _STRING.findall("\n".join(lines))
+
+
+def embedded():
+    """Entries of the index embedded in the zipapp, None when not running from one."""
+    loader = globals().get('__loader__')
+    if loader is None:
+        return None
+    try:
+        return json.loads(loader.get_data(j(os.path.dirname(__file__), EMBEDDED)))
+    except IOError:
+        return None
+
+
+def _score(query, entry):
+    """Higher is better, None when ``query`` doesn't match at all."""
+    name = entry['name']
+    if name.startswith(query):
+        return 100 - len(name)
+    if query in name:
+        return 80 - name.index(query)
+    for app in entry['apps']:
+        if query in app:
+            return 60
+    if query in entry['url'].lower():
+        return 40
+    # every character in order, the fewer gaps the better
+    position, gaps = -1, 0
+    for char in query:
+        found = name.find(char, position + 1)
+        if found < 0:
+            return None
+        gaps += found - position - 1
+        position = found
+    return 20 - gaps
+
+
+class CatalogIndex(object):
+    """Catalog packages by name, built from ``packages_dir``."""
+
+    def __init__(self, packages_dir, cache_file=None):
+        self.packages_dir = packages_dir
+        self.cache_file = cache_file
+        self.entries = {}
+        self.load()
+
+    def signature(self):
+        """Latest mtime of the catalog, changes whenever a package does."""
+        latest = os.path.getmtime(self.packages_dir)
+        for root, dirs, files in os.walk(self.packages_dir):
+            for name in dirs + [f for f in files if f.endswith('.py')]:
+                latest = max(latest, os.path.getmtime(j(root, name)))
+        return latest
+
+    def load(self):
+        entries = embedded()
+        if entries is not None:
+            self.entries = entries
+            return
+        signature = self.signature()
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                cache = json.load(open(self.cache_file))
+            except ValueError:
+                cache = {}
+            if cache.get('signature') == signature and cache.get('packages_dir') == self.packages_dir:
+                self.entries = cache['entries']
+                return
+
+        self.build()
+        if self.cache_file:
+            directory = os.path.dirname(self.cache_file)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            file = open(self.cache_file, "w")
+            json.dump({'signature': signature, 'packages_dir': self.packages_dir,
+                       'entries': self.entries}, file)
+            file.close()
+
+    def build(self):
+        self.entries = {}
+        for name in get_packages_list():
+            source = get_source(name)
+            self.entries[name] = dict(get_layout(name), **{
+                'name': name,
+                'source': source and list(source),
+                'url': source and source[1] or '',
+                'depends': list(get_dependencies(name)),
+                'apps': settings_names(j(self.packages_dir, name, 'settings.py'), 'INSTALLED_APPS'),
+            })
+
+    def names(self):
+        return sorted(self.entries)
+
+    def search(self, query):
+        """Package names matching every word of ``query``, best first."""
+        words = query.lower().split()
+        results = []
+        for name, entry in self.entries.items():
+            scores = [_score(word, entry) for word in words]
+            if None not in scores:
+                results.append((-sum(scores), name))
+        return [name for score, name in sorted(results)]
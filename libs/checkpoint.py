@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Checkpoint journal of a scaffold in progress
+
+``lazypony.journal`` in the output directory records the toolchain versions,
+the answers and the package plan once they are known, every stage with its
+result as it completes and how far each package got. A run finding a journal
+resumes the interrupted one: it doesn't probe or ask again, skips the stages
+which completed and doesn't install the packages which were installed
+already. The journal is removed once the scaffold completed.
+"""
+import os
+import json
+from os.path import join as j
+
+__all__ = ['JOURNAL_NAME', 'STEPS', 'Journal']
+
+JOURNAL_NAME = 'lazypony.journal'
+
+# How far a package got, in order
+STEPS = ('fetched', 'built', 'installed')
+
+# Job name prefix -> step it completes
+JOB_STEPS = {
+    'fetch': 'fetched',
+    'wheel': 'built',
+    'install': 'installed',
+}
+
+
+class Journal(object):
+    """
+    tools
+        Versions of pip and virtualenv, None until probed.
+    answers
+        Answers of the run, None until asked.
+    plan
+        ``Plan.as_dict`` of the packages being installed, None until chosen.
+    stages
+        Completed stage -> its result.
+    packages
+        Package -> last step in ``STEPS`` it completed.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.filename = j(base_path, JOURNAL_NAME)
+        self.tools = None
+        self.answers = None
+        self.plan = None
+        self.stages = {}
+        self.packages = {}
+        if os.path.exists(self.filename):
+            data = json.load(open(self.filename))
+            self.tools = data.get('tools')
+            self.answers = data.get('answers')
+            self.plan = data.get('plan')
+            self.stages = data.get('stages', {})
+            self.packages = data.get('packages', {})
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def save(self):
+        """Writes the journal, replacing the previous one in one step."""
+        if not os.path.isdir(self.base_path):
+            return
+        file = open(self.filename + '.tmp', "w")
+        json.dump({
+            'tools': self.tools,
+            'answers': self.answers,
+            'plan': self.plan,
+            'stages': self.stages,
+            'packages': self.packages,
+        }, file, indent=1, sort_keys=True)
+        file.close()
+        os.rename(self.filename + '.tmp', self.filename)
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def done(self, stage):
+        return stage in self.stages
+
+    def complete(self, stage, result=None):
+        self.stages[stage] = result
+        self.save()
+
+    def record(self, package, step):
+        """Notes that ``package`` got to ``step`` unless it got further."""
+        current = self.packages.get(package)
+        if current is None or STEPS.index(step) > STEPS.index(current):
+            self.packages[package] = step
+
+    def record_jobs(self, jobs, eggs):
+        """Records the completed fetch, wheel and install jobs.
+
+        ``eggs`` maps egg names to catalog packages.
+        """
+        for job in jobs:
+            parts = job.name.split(':')
+            if job.ok and len(parts) == 2 and parts[0] in JOB_STEPS and parts[1] in eggs:
+                self.record(eggs[parts[1]], JOB_STEPS[parts[0]])
+        self.save()
+
+    def installed(self):
+        return [p for p, step in self.packages.items() if step == 'installed']
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""DATABASES blocks of the generated settings
+
+Every settings variant gets a complete ``default`` database from the
+``db_*`` answers:
+
+development variants
+    the user's own database (``<name>_<user>``, or a sqlite file)
+production
+    the project's database, with ``db_pooler`` (``host:port`` of pgbouncer
+    or alike) set connecting through the pooler in transaction mode
+
+The pinned django (trunk of 2010) closes its connection after every
+request and knows neither ``CONN_MAX_AGE`` nor the ``TEST`` dictionary, so
+the pooler is the only way to reuse server connections, and the keys
+written are the ones it reads (``TEST_NAME``, ``TEST_CHARSET``).
+
+Test databases are named after the variant's database so users sharing a
+server don't drop each other's test database.
+"""
+from verify import PRODUCTION
+
+__all__ = ['ENGINES', 'DEFAULTS', 'databases']
+
+ENGINES = ('postgresql_psycopg2', 'mysql', 'sqlite3', 'oracle')
+
+DEFAULTS = {
+    'db_engine': 'postgresql_psycopg2',
+    'db_name': 'project',
+    'db_user': '',
+    'db_password': '',
+    'db_host': '',
+    'db_port': '',
+    'db_pooler': '',
+}
+
+
+def _format(value, indent=0):
+    """Python source of nested dictionaries, keys in a stable order."""
+    if not isinstance(value, dict):
+        return repr(value)
+    lines = ["{"]
+    for key in sorted(value):
+        lines.append("%s%r: %s," % (' ' * (indent + 4), key, _format(value[key], indent + 4)))
+    lines.append(' ' * indent + "}")
+    return "\n".join(lines)
+
+
+def databases(answers, variant, document_root):
+    """Source of the DATABASES dictionary for settings ``variant``."""
+    answers = dict(DEFAULTS.items() + answers.items())
+    engine = answers['db_engine']
+    if engine not in ENGINES:
+        raise ValueError("Unknown database engine '%s'" % engine)
+    production = variant == PRODUCTION
+
+    name = answers['db_name']
+    if not production:
+        name = '%s_%s' % (name, variant)
+    database = {
+        'ENGINE': 'django.db.backends.%s' % engine,
+        'NAME': name,
+        'USER': answers['db_user'],
+        'PASSWORD': answers['db_password'],
+        'HOST': answers['db_host'],
+        'PORT': answers['db_port'],
+        'TEST_NAME': 'test_%s' % name,
+    }
+
+    if engine == 'sqlite3':
+        database.update({'NAME': '%s%s.sqlite3' % (document_root, name),
+                         'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': ''})
+        # tests run on an in-memory database
+        database['TEST_NAME'] = None
+    elif engine == 'mysql':
+        database['OPTIONS'] = {'charset': 'utf8'}
+        database['TEST_CHARSET'] = 'utf8'
+
+    if production and answers['db_pooler'] and engine != 'sqlite3':
+        host, port = (answers['db_pooler'].split(':', 1) + [''])[:2]
+        database.update({'HOST': host, 'PORT': port})
+
+    return _format({'default': database})
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Index of the packages installed in a virtualenv
+
+site-packages is scanned for ``*.dist-info``, ``*.egg-info`` and
+``*.egg-link`` entries, giving the name, version and, where it can be told,
+the revision or wheel hash of every installed distribution. The index is
+cached in the virtualenv and only rebuilt when the mtime of a site-packages
+directory changes, which happens whenever something is installed or removed.
+"""
+import os
+import glob
+import json
+from os.path import join as j
+
+__all__ = ['normalize', 'wheel_name', 'InstalledIndex']
+
+CACHE_NAME = 'lazypony.installed'
+
+
+def normalize(name):
+    return name.lower().replace('_', '-').replace('.', '-')
+
+
+def wheel_name(filename):
+    """Distribution name of a wheel file"""
+    return os.path.basename(filename).split('-')[0]
+
+
+def _headers(filename):
+    """Name and Version from PKG-INFO/METADATA"""
+    headers = {}
+    if not os.path.isfile(filename):
+        return headers
+    for line in open(filename):
+        line = line.rstrip("\r\n")
+        if not line:
+            break
+        if ':' in line and not line[0].isspace():
+            key, value = line.split(':', 1)
+            if key in ('Name', 'Version'):
+                headers[key.lower()] = value.strip()
+    return headers
+
+
+def _dist_info(path):
+    dist = _headers(j(path, 'METADATA'))
+    direct = j(path, 'direct_url.json')
+    if os.path.exists(direct):
+        try:
+            data = json.load(open(direct))
+        except ValueError:
+            data = {}
+        dist['url'] = data.get('url')
+        dist['revision'] = data.get('vcs_info', {}).get('commit_id')
+        archive = data.get('archive_info', {})
+        digest = archive.get('hashes', {}).get('sha256')
+        if digest is None and archive.get('hash', '').startswith('sha256='):
+            digest = archive['hash'][len('sha256='):]
+        dist['sha256'] = digest
+    return dist
+
+
+def _egg_info(path):
+    if os.path.isdir(path):
+        return _headers(j(path, 'PKG-INFO'))
+    return _headers(path)
+
+
+def _egg_link(path):
+    location = open(path).readline().strip()
+    for info in glob.glob(j(location, '*.egg-info')):
+        dist = _egg_info(info)
+        dist['url'] = location
+        return dist
+    return {}
+
+
+SCANNERS = (
+    ('*.dist-info', _dist_info),
+    ('*.egg-info', _egg_info),
+    ('*.egg-link', _egg_link),
+)
+
+
+class InstalledIndex(object):
+    """Installed distributions of the virtualenv in ``env_dir`` by name."""
+
+    def __init__(self, env_dir):
+        self.env_dir = env_dir
+        self.cache_file = j(env_dir, CACHE_NAME)
+        self.dists = {}
+        self.load()
+
+    def site_packages(self):
+        return sorted(glob.glob(j(self.env_dir, 'lib', 'python*', 'site-packages')))
+
+    def load(self):
+        cache = {}
+        if os.path.exists(self.cache_file):
+            try:
+                cache = json.load(open(self.cache_file))
+            except ValueError:
+                pass
+
+        changed = False
+        for site in self.site_packages():
+            mtime = os.path.getmtime(site)
+            if site not in cache or cache[site]['mtime'] != mtime:
+                cache[site] = {'mtime': mtime, 'dists': self.scan(site)}
+                changed = True
+            for dist in cache[site]['dists']:
+                self.dists.setdefault(normalize(dist['name']), []).append(dist)
+
+        if changed:
+            file = open(self.cache_file, "w")
+            json.dump(cache, file)
+            file.close()
+
+    def scan(self, site):
+        dists = []
+        for pattern, scanner in SCANNERS:
+            for path in glob.glob(j(site, pattern)):
+                dist = scanner(path)
+                if dist.get('name'):
+                    dist['path'] = path
+                    dists.append(dist)
+        return dists
+
+    def satisfied(self, source, wheelhouse, digest=None):
+        """Whether ``source`` is installed at its pinned revision.
+
+        Distributions installed from the wheelhouse are recognized by the
+        hash of their wheel, the locked ``digest`` when it is given, ones
+        installed straight from the VCS by the revision pip recorded.
+        """
+        wheel = wheelhouse.wheel(source, digest)
+        name = wheel and wheel_name(wheel) or source[2]
+        for dist in self.dists.get(normalize(name), []):
+            if wheel and dist.get('sha256') == wheelhouse.digest(wheel):
+                return True
+            revision = dist.get('revision')
+            if revision and revision.startswith(str(source[3])) and \
+               (dist.get('url') or '').rstrip('/') == source[1].rstrip('/'):
+                return True
+        return False
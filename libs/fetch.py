@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Fetching pinned sources into the source cache
+
+Only the files of the pinned revision are ever transferred:
+
+git
+    a shallow fetch of exactly the pinned commit; a tag or an abbreviated
+    commit can't be fetched that way, its history is fetched without any file
+    contents (``--filter=blob:none``) to resolve it and only the files
+    checked out are transferred
+svn
+    ``svn export -r``
+hg
+    ``hg clone -r`` without a working copy followed by ``hg archive``
+
+A catalog entry may list ``SPARSE`` subpaths in its ``source.py``, then only
+those are materialized (``setup.py`` and the package directory usually).
+
+With a ``MirrorManager`` git and hg sources are read from the local bare
+mirror instead, for git by a ``--shared`` clone which copies nothing.
+
+Trees land in ``<cache>/<egg>-<rev>`` without any VCS metadata. They are
+fetched into a ``.part`` directory which is renamed by the last job, so an
+interrupted fetch never looks like a cached one.
+"""
+import os
+import re
+import shutil
+import hashlib
+from os.path import join as j
+
+from cache import CacheManifest
+from jobs import Job
+from mirrors import rewrite
+
+__all__ = ['job_name', 'SourceCache']
+
+FULL_SHA = re.compile(r'^[0-9a-f]{40}$')
+
+
+def job_name(source):
+    return 'fetch:%s' % source[2]
+
+
+def _git(source, sparse, part, url, mirror):
+    rev = str(source[3])
+    if mirror:
+        steps = [['git', 'clone', '-q', '--no-checkout', '--shared', mirror, part]]
+    elif FULL_SHA.match(rev):
+        steps = [
+            ['git', 'init', '-q', part],
+            ['git', '-C', part, 'fetch', '-q', '--depth', '1', url, rev],
+        ]
+        rev = 'FETCH_HEAD'
+    else:
+        steps = [
+            ['git', 'init', '-q', part],
+            ['git', '-C', part, 'remote', 'add', 'origin', url],
+            ['git', '-C', part, 'fetch', '-q', '--filter=blob:none', '--tags', 'origin'],
+        ]
+    if sparse:
+        steps.append(['git', '-C', part, 'sparse-checkout', 'set', '--no-cone'] + list(sparse))
+    steps.append(['git', '-C', part, 'checkout', '-q', rev])
+    steps.append(['rm', '-rf', j(part, '.git')])
+    return steps
+
+
+def _svn(source, sparse, part, url, mirror):
+    rev = source[3]
+    if not sparse:
+        return [['svn', 'export', '-q', '-r', str(rev), url, part]]
+    steps = []
+    for path in sparse:
+        parent = os.path.dirname(j(part, path))
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        steps.append(['svn', 'export', '-q', '-r', str(rev),
+                      '%s/%s' % (url.rstrip('/'), path), j(part, path)])
+    return steps
+
+
+def _hg(source, sparse, part, url, mirror):
+    rev = source[3]
+    repo = part + '.hg'
+    shutil.rmtree(repo, True)
+    archive = ['hg', 'archive', '-R', repo, '-r', str(rev), '--no-decode', '-X', '.hg_archival.txt']
+    for path in sparse:
+        archive += ['-I', path]
+    return [
+        ['hg', 'clone', '-q', '-U', '-r', str(rev), mirror or url, repo],
+        archive + [part],
+        ['rm', '-rf', repo],
+    ]
+
+
+STRATEGIES = {
+    'git': _git,
+    'svn': _svn,
+    'hg': _hg,
+}
+
+
+class SourceCache(object):
+    """Directory of fetched source trees shared by every project.
+
+    mirrors
+        Optional ``MirrorManager`` to read git and hg sources from.
+    rewrites
+        Url prefix rewrites applied to sources read from their origin.
+    """
+
+    def __init__(self, path, mirrors=None, rewrites={}):
+        self.path = path
+        self.mirrors = mirrors
+        self.rewrites = rewrites
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def tree(self, source, sparse=()):
+        """Directory the tree of ``source`` is (or will be) fetched to."""
+        name = '%s-%s' % (source[2], source[3])
+        if sparse:
+            name += '-' + hashlib.sha1("\n".join(sorted(sparse))).hexdigest()[:8]
+        return j(self.path, name)
+
+    def trees(self):
+        """Complete trees in the cache."""
+        return [j(self.path, name) for name in sorted(os.listdir(self.path))
+                if not name.startswith('.') and not name.endswith(('.part', '.hg'))
+                and os.path.isdir(j(self.path, name))]
+
+    def digest(self, tree):
+        """``tree_digest`` of a cached tree from its manifest, None when corrupt."""
+        return CacheManifest(tree).verify()['root']
+
+    def cached(self, source, sparse=(), digest=None):
+        """Tree of ``source`` if it was fetched, is intact and matches ``digest``."""
+        tree = self.tree(source, sparse)
+        if not os.path.isdir(tree):
+            return None
+        root = self.digest(tree)
+        if root is None or digest is not None and root != digest:
+            return None
+        return tree
+
+    def fetch_jobs(self, source, sparse=(), timeout=None, digest=None):
+        """Chain of jobs fetching ``source`` unless it is cached already.
+
+        The last job of the chain is named ``job_name(source)``.
+        """
+        if self.cached(source, sparse, digest):
+            return []
+        if source[0] not in STRATEGIES:
+            raise ValueError("Unsupported source type '%s'" % source[0])
+
+        tree = self.tree(source, sparse)
+        part = tree + '.part'
+        shutil.rmtree(part, True)
+        shutil.rmtree(tree, True)
+        CacheManifest(tree).remove()
+
+        jobs = []
+        mirror = None
+        if self.mirrors is not None and self.mirrors.mirrored(source):
+            mirror = self.mirrors.path(source)
+            job = self.mirrors.job(source, timeout)
+            if job is not None:
+                jobs.append(job)
+
+        url = rewrite(source[1], self.rewrites)
+        steps = STRATEGIES[source[0]](source, sparse, part, url, mirror)
+        steps.append(['mv', part, tree])
+
+        for i, args in enumerate(steps):
+            name = job_name(source) if i == len(steps) - 1 else '%s:%s' % (job_name(source), i)
+            depends = jobs and (jobs[-1].name,) or ()
+            jobs.append(Job(name, args, depends=depends, timeout=timeout))
+        return jobs
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Run history of scaffolds in a local SQLite database
+
+Every run records the duration of its stages, of every fetch, build and
+install job and the cache hits and misses, together with the revision each
+package was pinned at. The job durations double as the costs the JobRunner
+orders ready jobs by, and ``lazypony history`` reads the trends from here,
+flagging jobs which got much slower than they used to be.
+"""
+import os
+import time
+import sqlite3
+
+__all__ = ['REGRESSION', 'History']
+
+# A job this many times slower than its previous average is a regression
+REGRESSION = 2.0
+
+# Number of latest successful runs of a job its cost is averaged over
+RECENT = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    output_dir TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run INTEGER,
+    stage TEXT,
+    seconds REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    run INTEGER,
+    key TEXT,
+    package TEXT,
+    state TEXT,
+    seconds REAL
+);
+CREATE TABLE IF NOT EXISTS packages (
+    run INTEGER,
+    package TEXT,
+    revision TEXT,
+    PRIMARY KEY (run, package)
+);
+CREATE TABLE IF NOT EXISTS cache (
+    run INTEGER,
+    kind TEXT,
+    hits INTEGER,
+    misses INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, run);
+"""
+
+
+def _package(key):
+    """Egg name in a job key like ``wheel:south``, None for other jobs."""
+    parts = key.split(':')
+    return len(parts) > 1 and parts[1] or None
+
+
+class History(object):
+    """History database in ``filename``.
+
+    Stages, jobs and cache counters are recorded for the current run, one
+    is started by ``start`` or on the first record.
+    """
+
+    def __init__(self, filename):
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(SCHEMA)
+        self.run = None
+
+    def start(self, output_dir=None):
+        """Starts a run for ``output_dir``.
+
+        A run started implicitly (by probing the toolchain, say) is taken
+        over instead.
+        """
+        if self.run is not None and output_dir is not None:
+            cursor = self.db.execute("UPDATE runs SET output_dir = ? WHERE id = ? AND output_dir IS NULL",
+                                     (output_dir, self.run))
+            if cursor.rowcount:
+                self.db.commit()
+                return self.run
+        cursor = self.db.execute("INSERT INTO runs (started, output_dir) VALUES (?, ?)",
+                                 (time.time(), output_dir))
+        self.db.commit()
+        self.run = cursor.lastrowid
+        return self.run
+
+    def current(self):
+        if self.run is None:
+            self.start()
+        return self.run
+
+    def stage(self, stage, seconds):
+        self.db.execute("INSERT INTO stages VALUES (?, ?, ?)", (self.current(), stage, seconds))
+        self.db.commit()
+
+    def packages(self, sources):
+        """Records the revisions of the ``SOURCE`` tuples."""
+        self.db.executemany("INSERT OR REPLACE INTO packages VALUES (?, ?, ?)",
+                            [(self.current(), s[2], str(s[3])) for s in sources])
+        self.db.commit()
+
+    def cache(self, kind, hits, misses):
+        self.db.execute("INSERT INTO cache VALUES (?, ?, ?, ?)", (self.current(), kind, hits, misses))
+        self.db.commit()
+
+    # JobRunner timings
+
+    def cost(self, key, default=None):
+        """Average duration of the latest successful runs of job ``key``."""
+        rows = self.db.execute("SELECT seconds FROM jobs WHERE key = ? AND state = 'done' "
+                               "ORDER BY run DESC LIMIT ?", (key, RECENT)).fetchall()
+        if not rows:
+            return default
+        return sum([row[0] for row in rows]) / len(rows)
+
+    def record(self, jobs):
+        run = self.current()
+        self.db.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?, ?)",
+                            [(run, job.key, _package(job.key), job.state, job.duration)
+                             for job in jobs if job.duration is not None])
+
+    def save(self):
+        self.db.commit()
+
+    # Reports
+
+    def runs(self, limit=10):
+        """Latest runs, newest first, with their stage durations and cache counters."""
+        runs = []
+        for id, started, output_dir in self.db.execute(
+                "SELECT id, started, output_dir FROM runs ORDER BY id DESC LIMIT ?", (limit,)):
+            runs.append({'id': id, 'started': started, 'output_dir': output_dir})
+        for run in runs:
+            run['stages'] = dict(self.db.execute(
+                "SELECT stage, SUM(seconds) FROM stages WHERE run = ? GROUP BY stage", (run['id'],)))
+            run['cache'] = dict((kind, (hits, misses)) for kind, hits, misses in self.db.execute(
+                "SELECT kind, SUM(hits), SUM(misses) FROM cache WHERE run = ? GROUP BY kind", (run['id'],)))
+        return runs
+
+    def trends(self):
+        """Latest duration of every job next to its previous average.
+
+        Returns dictionaries with ``key``, ``latest``, ``previous`` (None
+        for a first run), the ``revision`` and ``previous_revision`` of its
+        package and whether it is a ``regression``.
+        """
+        trends = []
+        keys = [row[0] for row in self.db.execute("SELECT DISTINCT key FROM jobs WHERE state = 'done'")]
+        for key in sorted(keys):
+            rows = self.db.execute(
+                "SELECT jobs.run, jobs.seconds, packages.revision FROM jobs "
+                "LEFT JOIN packages ON packages.run = jobs.run AND packages.package = jobs.package "
+                "WHERE jobs.key = ? AND jobs.state = 'done' ORDER BY jobs.run DESC LIMIT ?",
+                (key, RECENT + 1)).fetchall()
+            latest, revision = rows[0][1], rows[0][2]
+            previous = rows[1:] and sum([row[1] for row in rows[1:]]) / len(rows[1:]) or None
+            trends.append({
+                'key': key,
+                'latest': latest,
+                'previous': previous,
+                'revision': revision,
+                'previous_revision': rows[1:] and rows[1][2] or None,
+                'regression': bool(previous and latest >= REGRESSION * previous),
+            })
+        return trends
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Import-time tracer, run by the project's interpreter
+
+    python importtrace.py <project dir> <output file>
+
+Boots the project the way a server would (settings, every INSTALLED_APPS
+entry and its models, the root urlconf) with ``__import__`` wrapped, and
+writes every import which loaded new modules as JSON: the module, the module
+importing it and the cumulative seconds it took. It must not import anything
+of lazypony, it runs in the project's virtualenv.
+"""
+import os
+import sys
+import json
+import time
+import __builtin__
+
+project_dir, output = sys.argv[1:3]
+sys.path[0:1] = [project_dir, os.path.dirname(project_dir.rstrip(os.sep))]
+os.chdir(project_dir)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+imports = []
+errors = {}
+_import = __builtin__.__import__
+
+
+def _traced(name, globals=None, locals=None, fromlist=None, level=-1):
+    loaded = len(sys.modules)
+    start = time.time()
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        if len(sys.modules) != loaded:
+            importer = (globals or {}).get('__name__', '')
+            # an implicit relative import is recorded under its full name
+            package = (globals or {}).get('__package__') or \
+                      ('__path__' in (globals or {}) and importer or importer.rpartition('.')[0])
+            if package and sys.modules.get('%s.%s' % (package, name)) is not None:
+                name = '%s.%s' % (package, name)
+            imports.append((name, importer, time.time() - start))
+
+
+def _load(stage, name):
+    try:
+        __import__(name)
+    except Exception, e:
+        errors[stage] = '%s: %s' % (e.__class__.__name__, e)
+
+
+__builtin__.__import__ = _traced
+started = time.time()
+
+_load('settings', 'settings')
+settings = sys.modules.get('settings')
+apps = list(getattr(settings, 'INSTALLED_APPS', ()))
+for app in apps:
+    _load(app, app)
+    if not os.path.exists(os.path.join(os.path.dirname(getattr(sys.modules.get(app), '__file__', '')), 'models.py')):
+        continue
+    _load(app, app + '.models')
+if hasattr(settings, 'ROOT_URLCONF'):
+    _load('urls', settings.ROOT_URLCONF)
+
+total = time.time() - started
+__builtin__.__import__ = _import
+
+file = open(output, 'w')
+json.dump({'total': total, 'apps': apps, 'imports': imports, 'errors': errors}, file)
+file.close()
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Bounded-concurrency runner for external commands (pip, virtualenv, vcs)
+
+A job is started as soon as every job it depends on has finished successfully
+and a worker slot is free. Among ready jobs the ones heading the longest chain
+of expected work (the critical path, by recorded durations) start first.
+Output of running jobs is streamed to the log line by line instead of being
+collected with communicate(). When a job fails, times out or can not be
+started, every job that depends on it is cancelled.
+
+Every command runs in its own process group so a timeout kills whatever it
+started too. The group doesn't get the terminal's Ctrl-C either, so when the
+runner is interrupted it kills the groups of the running jobs itself.
+"""
+import os
+import sys
+import signal
+import subprocess
+import threading
+import time
+from Queue import Queue, Empty
+
+__all__ = ['PENDING', 'RUNNING', 'DONE', 'FAILED', 'TIMEOUT', 'CANCELLED',
+           'Job', 'JobRunner']
+
+# Seconds between checks for finished jobs, a wait on a queue can't be
+# interrupted by a signal on python 2
+POLL_INTERVAL = 0.5
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+CANCELLED = 'cancelled'
+
+
+class Job(object):
+    """A single external command.
+
+    name
+        Unique name of the job, used in the log and in ``depends``.
+    args
+        Command line as a list, passed to subprocess.Popen. May also be a
+        callable returning the list, called when the job starts, for
+        commands which depend on results of earlier jobs.
+    depends
+        Names of jobs which must finish successfully before this one starts.
+    timeout
+        Seconds after which the command is killed, None for no limit.
+    capture
+        Keep output in ``self.output`` instead of writing it to the log.
+        Meant for short probes like ``pip --version``.
+    cost
+        Expected duration in seconds, used to order ready jobs.
+    key
+        Name the duration is recorded under in the timings history,
+        defaults to ``name``.
+    callback
+        Called with the job in the runner's thread once it finished.
+    """
+
+    def __init__(self, name, args, depends=(), timeout=None, cwd=None,
+                 env=None, capture=False, cost=None, key=None, callback=None):
+        self.name = name
+        self.args = callable(args) and args or list(args)
+        self.depends = tuple(depends)
+        self.timeout = timeout
+        self.cwd = cwd
+        self.env = env
+        self.capture = capture
+        self.cost = cost
+        self.key = key or name
+        self.callback = callback
+
+        self.state = PENDING
+        self.returncode = None
+        self.process = None
+        self.output = []
+        self.started = None
+        self.finished = None
+
+    def __repr__(self):
+        return "<Job %s: %s>" % (self.name, self.state)
+
+    @property
+    def ok(self):
+        return self.state == DONE
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def text(self):
+        return "".join(self.output)
+
+
+def _write_log(job, line):
+    sys.stdout.write("[%s] %s" % (job.name, line))
+    if not line.endswith("\n"):
+        sys.stdout.write(os.linesep)
+    sys.stdout.flush()
+
+
+class JobRunner(object):
+    """Runs added jobs respecting their dependencies.
+
+    workers
+        Maximum number of commands running at the same time.
+    log
+        Callable ``log(job, line)`` receiving streamed output lines.
+    timings
+        Optional ``History`` providing costs of jobs without one and
+        recording durations of finished jobs.
+    """
+
+    # Expected duration of jobs which never ran before
+    DEFAULT_COST = 1.0
+
+    def __init__(self, workers=4, log=None, timings=None):
+        self.workers = max(1, workers)
+        self.timings = timings
+        self.jobs = {}
+        self.order = []
+        self.priority = {}
+        self._log = log or _write_log
+        self._log_lock = threading.Lock()
+        self._finished = Queue()
+
+    def add(self, job):
+        if job.name in self.jobs:
+            raise ValueError("Duplicate job name '%s'" % job.name)
+        self.jobs[job.name] = job
+        self.order.append(job.name)
+        return job
+
+    def log(self, job, line):
+        self._log_lock.acquire()
+        try:
+            self._log(job, line)
+        finally:
+            self._log_lock.release()
+
+    def cost(self, job):
+        if job.cost is not None:
+            return job.cost
+        if self.timings is not None:
+            return self.timings.cost(job.key, self.DEFAULT_COST)
+        return self.DEFAULT_COST
+
+    def prioritize(self):
+        """Expected duration of the longest chain of jobs starting with each job."""
+        dependents = dict((name, []) for name in self.order)
+        for job in self.jobs.values():
+            for d in job.depends:
+                dependents[d].append(job.name)
+
+        self.priority = {}
+        def visit(name, path=()):
+            if name not in self.priority:
+                if name in path:
+                    raise ValueError("Dependency cycle: %s" % " -> ".join(path + (name,)))
+                tail = [visit(d, path + (name,)) for d in dependents[name]]
+                self.priority[name] = self.cost(self.jobs[name]) + max([0] + tail)
+            return self.priority[name]
+        for name in self.order:
+            visit(name)
+
+    def ready(self):
+        """Pending jobs whose dependencies are all done, in starting order."""
+        ready = [self.jobs[name] for name in self.order
+                 if self.jobs[name].state == PENDING and
+                    all(self.jobs[d].ok for d in self.jobs[name].depends)]
+        ready.sort(key=lambda job: -self.priority.get(job.name, 0))
+        return ready
+
+    def run(self):
+        """Runs every job and returns the dictionary of jobs by name.
+
+        Failures don't raise, check ``job.state`` of the returned jobs.
+        """
+        for job in self.jobs.values():
+            for d in job.depends:
+                if d not in self.jobs:
+                    raise ValueError("Job '%s' depends on unknown job '%s'" % (job.name, d))
+        self.prioritize()
+
+        running = 0
+        try:
+            while True:
+                for job in self.ready()[:self.workers - running]:
+                    self._start(job)
+                    running += 1
+
+                if not running:
+                    break
+
+                try:
+                    job = self._finished.get(True, POLL_INTERVAL)
+                except Empty:
+                    continue
+                running -= 1
+                if job.callback is not None:
+                    job.callback(job)
+                if not job.ok:
+                    self._cancel_dependents(job)
+        except:
+            self._kill_running()
+            raise
+
+        if self.timings is not None:
+            self.timings.record(self.jobs.values())
+            self.timings.save()
+        return self.jobs
+
+    def _start(self, job):
+        job.state = RUNNING
+        job.started = time.time()
+        if callable(job.args):
+            try:
+                job.args = job.args()
+            except Exception, e:
+                # finished like any other failed job, so dependents get cancelled
+                job.state = FAILED
+                job.finished = time.time()
+                self.log(job, "could not build the command: %s" % e)
+                self._finished.put(job)
+                return
+        thread = threading.Thread(target=self._execute, args=(job,))
+        thread.setDaemon(True)
+        thread.start()
+
+    def _kill_running(self):
+        for job in self.jobs.values():
+            if job.state == RUNNING and job.process is not None:
+                try:
+                    os.killpg(job.process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+    def _execute(self, job):
+        try:
+            try:
+                # own process group, so a timeout also kills the children
+                # (pip, git) holding the output pipe open
+                process = subprocess.Popen(job.args, cwd=job.cwd, env=job.env,
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT,
+                                           preexec_fn=os.setsid)
+                job.process = process
+            except OSError, e:
+                job.state = FAILED
+                self.log(job, "could not start %s: %s" % (job.args[0], e))
+                return
+
+            timer = None
+            expired = []
+            if job.timeout is not None:
+                def kill():
+                    expired.append(True)
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                timer = threading.Timer(job.timeout, kill)
+                timer.start()
+
+            for line in iter(process.stdout.readline, ''):
+                if job.capture:
+                    job.output.append(line)
+                else:
+                    self.log(job, line)
+            process.stdout.close()
+            job.returncode = process.wait()
+
+            if timer is not None:
+                timer.cancel()
+
+            if expired:
+                job.state = TIMEOUT
+                self.log(job, "killed after %ss" % job.timeout)
+            elif job.returncode:
+                job.state = FAILED
+                self.log(job, "exited with code %s" % job.returncode)
+            else:
+                job.state = DONE
+        finally:
+            job.finished = time.time()
+            self._finished.put(job)
+
+    def _cancel_dependents(self, failed):
+        queue = [failed.name]
+        while queue:
+            name = queue.pop()
+            for job in self.jobs.values():
+                if job.state == PENDING and name in job.depends:
+                    job.state = CANCELLED
+                    self.log(job, "cancelled, '%s' %s" % (failed.name, failed.state))
+                    queue.append(job.name)
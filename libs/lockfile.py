@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Lockfile with the fully resolved install plan of a project
+
+``lazypony.lock`` records the resolved package order, the pinned revision of
+every ``SOURCE`` and the hashes of the artifacts built from them. When it is
+present the catalog is neither imported nor resolved again: sources are taken
+from the lockfile and wheels straight from the wheelhouse, checked by hash.
+"""
+import os
+import json
+from os.path import join as j
+
+from settings import LOCK_NAME
+from wheelhouse import requirement
+
+__all__ = ['LOCK_NAME', 'Lockfile']
+
+
+class Lockfile(object):
+    """
+    packages
+        List of entries in install order. Every entry is a dictionary with
+        the package ``name``, the ``source`` tuple, the packages it
+        ``depends`` on, its ``sparse`` subpaths,
+        ``dependency`` telling if it was only pulled in as a dependency, the
+        ``tree`` hash of the fetched source, the ``wheel`` file name and
+        its ``sha256``.
+    """
+
+    def __init__(self, base_path):
+        self.filename = j(base_path, LOCK_NAME)
+        self.packages = []
+        if os.path.exists(self.filename):
+            self.packages = json.load(open(self.filename))['packages']
+            for entry in self.packages:
+                entry['source'] = entry['source'] and tuple(entry['source'])
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def save(self):
+        file = open(self.filename, "w")
+        json.dump({'packages': self.packages}, file, indent=1, sort_keys=True)
+        file.close()
+
+    def lock(self, packages, dependencies, sources, wheelhouse, sparse={}, trees={}, depends={}, digests={}):
+        """Records the plan.
+
+        packages, dependencies
+            Package names, requested ones and the ones pulled in as
+            dependencies.
+        sources
+            Package name -> ``SOURCE`` tuple.
+        wheelhouse
+            Wheelhouse holding the wheels built for the sources.
+        sparse, trees, depends
+            Package name -> sparse subpaths, hash of the fetched tree and
+            names of the packages it depends on.
+        digests
+            Requirement line -> wheel hash locked before, which stays locked.
+        """
+        self.packages = []
+        for name in list(dependencies) + list(packages):
+            wheel = sources[name] and wheelhouse.wheel(sources[name], digests.get(requirement(sources[name])))
+            self.packages.append({
+                'name': name,
+                'dependency': name in dependencies,
+                'source': sources[name],
+                'depends': list(depends.get(name, ())),
+                'sparse': list(sparse.get(name, ())),
+                'tree': trees.get(name),
+                'wheel': wheel and os.path.basename(wheel),
+                'sha256': wheel and wheelhouse.digest(wheel),
+            })
+
+    def names(self, dependency):
+        return [e['name'] for e in self.packages if e['dependency'] == dependency]
+
+    def sources(self):
+        return dict((e['name'], e['source']) for e in self.packages)
+
+    def depends(self):
+        return dict((e['name'], tuple(e.get('depends', ()))) for e in self.packages)
+
+    def sparse(self):
+        return dict((e['name'], tuple(e.get('sparse', ()))) for e in self.packages)
+
+    def trees(self):
+        return dict((e['name'], e.get('tree')) for e in self.packages)
+
+    def digests(self):
+        """Requirement line -> expected wheel hash."""
+        return dict((requirement(e['source']), e['sha256']) for e in self.packages if e['source'])
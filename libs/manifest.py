@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Manifest of a generated project
+
+Keeps the content hash of every generated file together with the answers and
+the installed packages of the last run. Re-running lazypony in update mode
+renders the project in memory and only writes files whose content changed;
+only sources missing from the project's environment get fetched and installed.
+"""
+import os
+import json
+import hashlib
+from os.path import join as j
+
+__all__ = ['MANIFEST_NAME', 'content_hash', 'Manifest']
+
+MANIFEST_NAME = 'lazypony.manifest'
+
+
+def content_hash(string):
+    return hashlib.sha1(string).hexdigest()
+
+
+def file_hash(filename):
+    if not os.path.exists(filename):
+        return None
+    return content_hash(open(filename, "rb").read())
+
+
+class Manifest(object):
+    """
+    files
+        Relative path -> content hash of every file lazypony generated.
+    answers
+        Answers given to the interactive prompts.
+    packages
+        Catalog packages installed into the project.
+    sources
+        Requirement lines of the installed sources.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.filename = j(base_path, MANIFEST_NAME)
+        self.files = {}
+        self.answers = {}
+        self.packages = []
+        self.sources = []
+        if os.path.exists(self.filename):
+            data = json.load(open(self.filename))
+            self.files = data.get('files', {})
+            self.answers = data.get('answers', {})
+            self.packages = data.get('packages', [])
+            self.sources = data.get('sources', [])
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def save(self):
+        file = open(self.filename, "w")
+        json.dump({
+            'files': self.files,
+            'answers': self.answers,
+            'packages': self.packages,
+            'sources': self.sources,
+        }, file, indent=1, sort_keys=True)
+        file.close()
+
+    def diff(self, rendered):
+        """Compares rendered files (relative path -> content) with the manifest.
+
+        Returns three lists of relative paths: files to write, files removed
+        from the project and files edited by hand since they were generated,
+        which are left alone.
+        """
+        write, edited = [], []
+        for path, content in sorted(rendered.items()):
+            known = self.files.get(path)
+            current = file_hash(j(self.base_path, path))
+            if known is not None and current is not None and current != known:
+                if current != content_hash(content):
+                    edited.append(path)
+                continue
+            if current != content_hash(content):
+                write.append(path)
+        removed = [path for path in sorted(self.files) if path not in rendered and
+                   file_hash(j(self.base_path, path)) == self.files[path]]
+        return write, removed, edited
+
+    def apply(self, rendered):
+        """Writes changed files, deletes stale ones and updates the hashes.
+
+        Returns the result of ``diff``.
+        """
+        write, removed, edited = self.diff(rendered)
+        for path in write:
+            directory = os.path.dirname(j(self.base_path, path))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            file = open(j(self.base_path, path), "w")
+            file.write(rendered[path])
+            file.close()
+        for path in removed:
+            os.remove(j(self.base_path, path))
+            del self.files[path]
+        for path in rendered:
+            if path not in edited:
+                self.files[path] = content_hash(rendered[path])
+        return write, removed, edited
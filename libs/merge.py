@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Merging the settings of the installed packages
+
+Every catalog package may have a ``settings.py`` fragment. Fragments are
+copied to ``project/conf/packages`` and executed by the generated settings,
+but each of them would replace the list settings of the ones before, so
+those are merged here instead, de-duplicated and in install order with
+django first, and written to the settings after the fragments ran.
+
+A package may name entries which must come ``FIRST`` or ``LAST`` in its
+``__init__``, like the cache middleware which has to wrap every other one,
+and annotate entries in its ``ORDER``::
+
+    ORDER = {
+        'django.contrib.auth.middleware.AuthenticationMiddleware': {
+            'after': ('django.contrib.sessions.middleware.SessionMiddleware',),
+            'cost': 1,
+        },
+    }
+
+``before`` and ``after`` name entries (of any package) it has to precede or
+follow, ``cost`` is its relative cost per request. Lists keep the install
+order as far as the constraints allow, only an entry with a cost may move
+ahead of a costlier one which is free to go at the same point, so
+middleware which answers requests on its own cheaply runs before the
+expensive ones. Entries without a cost keep their position.
+"""
+import os
+from os.path import join as j
+
+from catalog import settings_names
+
+__all__ = ['LISTS', 'DEFAULT_COST', 'EXPENSIVE', 'fragment', 'files', 'settings_order',
+           'combine', 'order', 'merge', 'expensive', 'format_list']
+
+LISTS = ('MIDDLEWARE_CLASSES', 'TEMPLATE_CONTEXT_PROCESSORS', 'INSTALLED_APPS')
+
+# Cost reported for entries nobody annotated, they are never moved for it
+DEFAULT_COST = 1
+
+# Context processors from this cost on are reported, they run for every
+# RequestContext whether the template uses them or not
+EXPENSIVE = 5
+
+
+def fragment(packages_dir, name):
+    """Settings fragment of package ``name``, None when it has none."""
+    filename = j(packages_dir, name, 'settings.py')
+    return os.path.exists(filename) and filename or None
+
+
+def files(packages_dir, name):
+    """Relative path -> content of the files package ``name`` adds to projects.
+
+    They are kept in the ``files`` directory of the package, laid out like
+    the project.
+    """
+    root = j(packages_dir, name, 'files')
+    found = {}
+    for path, dirs, names in os.walk(root):
+        for filename in names:
+            if not filename.endswith(('.pyc', '.pyo')):
+                found[os.path.relpath(j(path, filename), root)] = open(j(path, filename)).read()
+    return found
+
+
+def settings_order(packages):
+    """Install order with django first, the others build on its settings."""
+    return [p for p in packages if p == 'django'] + [p for p in packages if p != 'django']
+
+
+def combine(orders):
+    """Single constraints dictionary from the ``ORDER`` of several packages."""
+    combined = {}
+    for order in orders:
+        for name, constraints in order.items():
+            entry = combined.setdefault(name, {'before': [], 'after': []})
+            for key in ('before', 'after'):
+                entry[key] += [n for n in constraints.get(key, ()) if n not in entry[key]]
+            if 'cost' in constraints:
+                entry['cost'] = max(entry.get('cost', 0), constraints['cost'])
+    return combined
+
+
+def _cost(constraints, name):
+    return constraints.get(name, {}).get('cost', DEFAULT_COST)
+
+
+def order(names, constraints):
+    """``names`` ordered by the before/after ``constraints``, a stable sort.
+
+    Of the names free to go next the first one in the original order is
+    taken, unless it has a cost and another free one has a lower cost.
+    Raises ValueError when the constraints contradict each other.
+    """
+    index = dict((name, i) for i, name in enumerate(names))
+    preceding = dict((name, set()) for name in names)
+    for name in names:
+        for other in constraints.get(name, {}).get('after', ()):
+            if other in index and other != name:
+                preceding[name].add(other)
+        for other in constraints.get(name, {}).get('before', ()):
+            if other in index and other != name:
+                preceding[other].add(name)
+
+    ordered = []
+    while preceding:
+        free = [name for name, before in preceding.items() if not before]
+        if not free:
+            raise ValueError("Contradicting order constraints between %s" % ", ".join(sorted(preceding)))
+        name = min(free, key=index.get)
+        if 'cost' in constraints.get(name, {}):
+            name = min([n for n in free if 'cost' in constraints.get(n, {})],
+                       key=lambda n: (constraints[n]['cost'], index[n]))
+        ordered.append(name)
+        del preceding[name]
+        for before in preceding.values():
+            before.discard(name)
+    return ordered
+
+
+def merge(packages_dir, packages, exclude=(), first=(), last=(), constraints={}):
+    """Setting -> merged names, packages in ``exclude`` are left out.
+
+    Every list is ordered by ``constraints``, then names in ``first`` and
+    ``last`` are moved to its start and end.
+    """
+    merged = dict((setting, []) for setting in LISTS)
+    for name in settings_order(packages):
+        filename = fragment(packages_dir, name)
+        if name in exclude or filename is None:
+            continue
+        for setting in LISTS:
+            for value in settings_names(filename, setting):
+                if value not in merged[setting]:
+                    merged[setting].append(value)
+    for setting, names in merged.items():
+        names = order(names, constraints)
+        merged[setting] = [n for n in first if n in names] + \
+                          [n for n in names if n not in first and n not in last] + \
+                          [n for n in last if n in names]
+    return merged
+
+
+def expensive(names, constraints):
+    """(name, cost) of the ``names`` costing EXPENSIVE or more."""
+    return [(name, _cost(constraints, name)) for name in names
+            if _cost(constraints, name) >= EXPENSIVE]
+
+
+def format_list(names):
+    return "(\n%s)" % "".join(["    %r,\n" % name for name in names])
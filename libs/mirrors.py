@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Local bare mirrors of source repositories
+
+Every git and hg ``SOURCE`` url gets a bare mirror under the mirror root. A
+mirror is only refreshed, with an incremental fetch/pull, when the pinned
+revision is not in it yet; fetches then read from the mirror instead of the
+original host.
+
+Subversion has no cheap bare copy of a single url (svnsync mirrors a whole
+repository with all its history), and ``svn export -r`` only transfers the
+pinned tree anyway, so svn urls are only rewritten, not mirrored.
+
+``rewrites`` maps url prefixes to replacements, e.g. to point build nodes at
+an internal ``file://`` or LAN mirror of the original hosts.
+"""
+import os
+import subprocess
+import hashlib
+from os.path import join as j
+
+from jobs import Job
+
+__all__ = ['rewrite', 'MirrorManager']
+
+
+def rewrite(url, rewrites):
+    """Applies the longest matching prefix of ``rewrites`` to ``url``"""
+    for prefix in sorted(rewrites, key=len, reverse=True):
+        if url.startswith(prefix):
+            return rewrites[prefix] + url[len(prefix):]
+    return url
+
+
+def _quiet(args):
+    devnull = open(os.devnull, 'w')
+    try:
+        try:
+            return subprocess.call(args, stdout=devnull, stderr=devnull) == 0
+        except OSError:
+            return False
+    finally:
+        devnull.close()
+
+
+def _git_has(mirror, rev):
+    return _quiet(['git', '--git-dir', mirror, 'cat-file', '-e', '%s^{commit}' % rev])
+
+
+def _hg_has(mirror, rev):
+    return _quiet(['hg', '-R', mirror, 'log', '-q', '-r', str(rev)])
+
+
+MIRRORED = {
+    # vcs: (create, refresh, has revision)
+    'git': (lambda url, mirror: ['git', 'clone', '-q', '--mirror', url, mirror],
+            lambda url, mirror: ['git', '--git-dir', mirror, 'fetch', '-q', '--prune', url, '+refs/*:refs/*'],
+            _git_has),
+    'hg': (lambda url, mirror: ['hg', 'clone', '-q', '-U', url, mirror],
+           lambda url, mirror: ['hg', '-R', mirror, 'pull', '-q', url],
+           _hg_has),
+}
+
+
+class MirrorManager(object):
+    """Bare mirrors kept under ``root``, one per source url."""
+
+    def __init__(self, root, rewrites={}):
+        self.root = root
+        self.rewrites = rewrites
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def url(self, source):
+        """Url ``source`` is fetched from, after rewriting."""
+        return rewrite(source[1], self.rewrites)
+
+    def mirrored(self, source):
+        return source[0] in MIRRORED
+
+    def path(self, source):
+        url = source[1]
+        name = url.rstrip('/').split('/')[-1] or source[2]
+        return j(self.root, source[0], '%s-%s' % (name, hashlib.sha1(url).hexdigest()[:12]))
+
+    def job(self, source, timeout=None):
+        """Job creating or refreshing the mirror of ``source``.
+
+        Returns None when the mirror already holds the pinned revision.
+        """
+        create, refresh, has = MIRRORED[source[0]]
+        mirror = self.path(source)
+        if not os.path.exists(mirror):
+            if not os.path.isdir(os.path.dirname(mirror)):
+                os.makedirs(os.path.dirname(mirror))
+            args = create(self.url(source), mirror)
+        elif has(mirror, source[3]):
+            return None
+        else:
+            args = refresh(self.url(source), mirror)
+        return Job('mirror:%s' % source[2], args, timeout=timeout)
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""Sharing the caches of build nodes over HTTP
+
+``lazypony cache-serve`` serves the wheelhouse and source cache of a node as
+content-addressed blobs::
+
+    GET /index.json         wheels (requirement line -> file name, hash and
+                            size of each wheel, the latest last) and trees (directory name -> relative path
+                            -> hash, size, mode or symlink target)
+    GET /blobs/<sha256>     a file, honouring ``Range: bytes=<start>-<end>``
+
+Nodes listing peers in ``LAZYPONY_PEERS`` ask them before fetching anything
+from the origin. Blobs larger than ``RANGE_SIZE`` are split into ranges
+which are downloaded concurrently, spread over every peer having the blob,
+and each blob is checked against its hash before a wheel or tree is put in
+place. A peer which doesn't answer is skipped, the VCS is the fallback, and
+so is one whose index names anything outside the caches (see ``bundle``).
+"""
+import os
+import re
+import json
+import shutil
+import socket
+import urllib2
+import threading
+import SocketServer
+import BaseHTTPServer
+from multiprocessing.pool import ThreadPool
+from os.path import join as j
+
+from bundle import check_wheel, check_tree, tree_entries, assemble
+from cache import file_digest
+from fetch import SourceCache
+from wheelhouse import Wheelhouse, requirement
+
+__all__ = ['RANGE_SIZE', 'CacheIndex', 'serve', 'Peers']
+
+# Blobs larger than this are downloaded in ranges of this size
+RANGE_SIZE = 8 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+BLOB = re.compile(r'^/blobs/([0-9a-f]{64})$')
+RANGE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+def _check_index(index):
+    """Raises ValueError unless every wheel and tree of a peer's index is safe to add."""
+    for req, wheels in index['wheels'].items():
+        if not isinstance(wheels, list):
+            raise ValueError("wheels of %s aren't listed by hash" % req)
+        for wheel in wheels:
+            check_wheel(wheel)
+    for name, entries in index['trees'].items():
+        check_tree(name, entries)
+
+
+class CacheIndex(object):
+    """Blobs of a wheelhouse and source cache by hash.
+
+    Hashes come from the manifests of the cached entries, corrupt ones
+    are left out.
+    """
+
+    def __init__(self, wheelhouse_path, sources_path):
+        self.wheelhouse_path = wheelhouse_path
+        self.source_cache = SourceCache(sources_path)
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Index of what the caches hold now."""
+        self._lock.acquire()
+        try:
+            index = {'wheels': {}, 'trees': {}}
+            blobs = {}
+            wheelhouse = Wheelhouse(self.wheelhouse_path)
+            for req, digest, filename in wheelhouse.entries():
+                index['wheels'].setdefault(req, []).append({
+                    'name': os.path.basename(filename), 'sha256': digest, 'size': os.path.getsize(filename)})
+                blobs[digest] = filename
+
+            for tree in self.source_cache.trees():
+                entries = tree_entries(tree)
+                if entries is None:
+                    continue
+                index['trees'][os.path.basename(tree)] = entries
+                for relative, entry in entries.items():
+                    if 'sha256' in entry:
+                        blobs[entry['sha256']] = j(tree, relative)
+            self.blobs = blobs
+            return index
+        finally:
+            self._lock.release()
+
+
+class BlobHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    server_version = 'lazypony-cache'
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        if self.path == '/index.json':
+            data = json.dumps(self.server.index.refresh())
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if body: self.wfile.write(data)
+            return
+
+        match = BLOB.match(self.path)
+        filename = match and self.server.index.blobs.get(match.group(1))
+        if not filename or not os.path.isfile(filename):
+            self.send_error(404)
+            return
+        size = os.path.getsize(filename)
+        start, end = 0, size - 1
+        requested = RANGE.match(self.headers.get('Range', ''))
+        if requested:
+            start = int(requested.group(1))
+            end = min(int(requested.group(2) or end), end)
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%s' % size)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, end, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not body:
+            return
+        file = open(filename, 'rb')
+        try:
+            file.seek(start)
+            left = end - start + 1
+            while left > 0:
+                chunk = file.read(min(CHUNK_SIZE, left))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                left -= len(chunk)
+        finally:
+            file.close()
+
+
+class BlobServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address, wheelhouse_path, sources_path):
+    """Serves the caches on ``address``, a (host, port) pair, until interrupted."""
+    server = BlobServer(address, BlobHandler)
+    server.index = CacheIndex(wheelhouse_path, sources_path)
+    server.index.refresh()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Peers(object):
+    """Caches of other nodes, asked before fetching from the origin.
+
+    urls
+        Base urls of ``lazypony cache-serve`` instances.
+    workers
+        Number of ranges downloaded at once.
+    """
+
+    def __init__(self, urls, wheelhouse, source_cache, workers=4, timeout=10, log=None):
+        self.urls = [url.rstrip('/') for url in urls]
+        self.wheelhouse = wheelhouse
+        self.source_cache = source_cache
+        self.workers = workers
+        self.timeout = timeout
+        self.log = log or (lambda line: None)
+
+    def indexes(self):
+        """(url, index) of every peer answering."""
+        indexes = []
+        for url in self.urls:
+            try:
+                index = json.load(urllib2.urlopen(url + '/index.json', timeout=self.timeout))
+            except (IOError, ValueError, socket.error), e:
+                self.log("Cache peer %s not available: %s" % (url, e))
+                continue
+            try:
+                _check_index(index)
+            except (ValueError, KeyError, AttributeError), e:
+                self.log("Cache peer %s skipped, unsafe index: %s" % (url, e))
+                continue
+            indexes.append((url, index))
+        return indexes
+
+    def _range(self, task):
+        """Downloads one range of a blob into its place in ``target``.
+
+        Peers having the blob are tried in turn, starting with the one the
+        range was assigned to.
+        """
+        digest, target, start, end, urls = task
+        for url in urls:
+            request = urllib2.Request('%s/blobs/%s' % (url, digest),
+                                      headers={'Range': 'bytes=%s-%s' % (start, end)})
+            try:
+                response = urllib2.urlopen(request, timeout=self.timeout)
+                if response.getcode() != 206 and start:
+                    continue
+                file = open(target, 'r+b')
+                try:
+                    file.seek(start)
+                    left = end - start + 1
+                    while left > 0:
+                        chunk = response.read(min(CHUNK_SIZE, left))
+                        if not chunk:
+                            break
+                        file.write(chunk)
+                        left -= len(chunk)
+                finally:
+                    file.close()
+                if not left:
+                    return True
+            except (IOError, socket.error):
+                pass
+        return False
+
+    def _verify(self, item):
+        digest, target = item
+        return digest, os.path.exists(target) and file_digest(target) == digest
+
+    def download(self, blobs, staging):
+        """Downloads ``blobs``, hash -> (size, peer urls), into ``staging``.
+
+        Returns the hashes of the blobs downloaded and verified.
+        """
+        tasks = []
+        for i, (digest, (size, urls)) in enumerate(sorted(blobs.items())):
+            target = j(staging, digest)
+            file = open(target, 'wb')
+            file.truncate(size)
+            file.close()
+            for n, start in enumerate(range(0, size, RANGE_SIZE)):
+                first = (i + n) % len(urls)
+                tasks.append((digest, target, start, min(start + RANGE_SIZE, size) - 1,
+                              urls[first:] + urls[:first]))
+
+        pool = ThreadPool(self.workers)
+        try:
+            failed = set([task[0] for task, ok in zip(tasks, pool.map(self._range, tasks)) if not ok])
+            checked = pool.map(self._verify, [(d, j(staging, d)) for d in blobs if d not in failed])
+        finally:
+            pool.close()
+            pool.join()
+        verified = set()
+        for digest, ok in checked:
+            if ok:
+                verified.add(digest)
+            else:
+                self.log("Blob %s from the cache peers doesn't match its hash" % digest)
+        return verified
+
+    def pull(self, sources, digests={}):
+        """Adds the wheels, or else the trees, of ``sources`` the peers have.
+
+        ``sources`` are (SOURCE, sparse) pairs missing from the wheelhouse,
+        ``digests`` maps requirement lines to expected wheel hashes. Returns
+        the requirement lines of the ``wheels`` and ``trees`` added and the
+        number of sources ``missing`` from every peer.
+        """
+        pulled = {'wheels': [], 'trees': [], 'missing': 0}
+        indexes = self.indexes()
+        if not indexes:
+            pulled['missing'] = len(sources)
+            return pulled
+
+        wheels, trees, blobs = {}, {}, {}
+
+        def want(digest, size, url):
+            blobs.setdefault(digest, (size, []))[1].append(url)
+
+        for source, sparse in sources:
+            req = requirement(source)
+            tree = self.source_cache.tree(source, sparse)
+            for url, index in indexes:
+                matching = [w for w in index['wheels'].get(req, [])
+                            if digests.get(req) in (None, w['sha256'])]
+                if matching and wheels.get(req, matching[-1])['sha256'] == matching[-1]['sha256']:
+                    wheels[req] = matching[-1]
+                    want(matching[-1]['sha256'], matching[-1]['size'], url)
+            if req in wheels:
+                continue
+            if os.path.isdir(tree):
+                continue
+            for url, index in indexes:
+                entries = index['trees'].get(os.path.basename(tree))
+                if entries is not None:
+                    trees[req] = (tree, entries)
+                    for entry in entries.values():
+                        if 'sha256' in entry:
+                            want(entry['sha256'], entry['size'], url)
+            if req not in trees:
+                pulled['missing'] += 1
+
+        if not blobs:
+            return pulled
+        staging = j(self.source_cache.path, '.peers')
+        shutil.rmtree(staging, True)
+        os.makedirs(staging)
+        try:
+            verified = self.download(blobs, staging)
+            for req, wheel in sorted(wheels.items()):
+                if wheel['sha256'] in verified:
+                    self.wheelhouse.add(req, j(staging, wheel['sha256']), wheel['name'])
+                    pulled['wheels'].append(req)
+            self.wheelhouse.save()
+            for req, (tree, entries) in sorted(trees.items()):
+                if [e for e in entries.values() if 'sha256' in e and e['sha256'] not in verified]:
+                    continue
+                assemble(tree, entries, lambda digest: j(staging, digest))
+                pulled['trees'].append(req)
+        finally:
+            shutil.rmtree(staging, True)
+        pulled['missing'] += len(wheels) + len(trees) - len(pulled['wheels']) - len(pulled['trees'])
+        return pulled
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Byte-compiling a scaffolded project ahead of its first start
+
+Without it the first start on a new host compiles every module, in each
+prefork worker starting at the same time. Files are compiled by the
+interpreter the project runs on, the one of its virtualenv, which may be
+another python than lazypony's: bytecode of a different magic number would
+be ignored and written again at the first start. A few of its processes
+compile the files in parallel, each leaving alone the ones whose bytecode
+is current.
+
+Installed packages aren't compiled here, pip compiles what it installs into
+``env``.
+"""
+import os
+import sys
+import subprocess
+import multiprocessing
+from os.path import join as j
+
+__all__ = ['DIRECTORIES', 'sources', 'precompile']
+
+# Directories of a project compiled after installing, ``3rdparty`` holds
+# apps and libraries copied in by hand
+DIRECTORIES = (
+    j('3rdparty', 'packages'),
+    j('3rdparty', 'apps'),
+    'project',
+)
+
+# Run by the project's interpreter, python 2 or 3: compiles the files named
+# on stdin unless their bytecode is current, prints the state of each
+COMPILER = r'''
+import os, sys, compileall
+try:
+    from importlib.util import cache_from_source
+except ImportError:
+    cache_from_source = lambda filename: filename + 'c'
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+def stamp(filename):
+    try:
+        stat = os.stat(cache_from_source(filename))
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        return None
+
+out = sys.stdout
+for filename in sys.stdin.read().splitlines():
+    before = stamp(filename)
+    # compileall prints compile errors
+    sys.stdout = StringIO()
+    try:
+        try:
+            ok = compileall.compile_file(filename, quiet=1)
+        except Exception:
+            ok = False
+        error = sys.stdout.getvalue()
+    finally:
+        sys.stdout = out
+    state = not ok and 'failed' or stamp(filename) != before and 'compiled' or 'current'
+    out.write('%s\t%s\t%s\n' % (state, filename, ' '.join(error.split())))
+'''
+
+
+def sources(directories):
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith('.py'):
+                    yield j(root, name)
+
+
+def precompile(directories, interpreter=None, processes=None):
+    """Compiles the stale sources under ``directories`` with ``interpreter``.
+
+    Returns the number of files ``compiled`` and found ``current`` and
+    (filename, error) of the ones which ``failed``.
+    """
+    files = list(sources(directories))
+    result = {'compiled': 0, 'current': 0, 'failed': []}
+    if not files:
+        return result
+    processes = min(len(files), processes or multiprocessing.cpu_count())
+    interpreter = interpreter or sys.executable
+    running = []
+    for i in range(processes):
+        # every worker reads its whole share before writing anything
+        process = subprocess.Popen([interpreter, '-c', COMPILER],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        process.stdin.write("\n".join(files[i::processes]))
+        process.stdin.close()
+        running.append((process, files[i::processes]))
+    for process, share in running:
+        reported = set()
+        for line in process.stdout.read().splitlines():
+            state, filename, error = line.split('\t', 2)
+            reported.add(filename)
+            if state == 'failed':
+                result['failed'].append((filename, error or "not compiled by %s" % interpreter))
+            else:
+                result[state] += 1
+        process.stdout.close()
+        code = process.wait()
+        result['failed'] += [(filename, "%s exited with code %s" % (interpreter, code))
+                             for filename in share if filename not in reported]
+    return result
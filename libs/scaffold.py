@@ -0,0 +1,562 @@
+# -*- coding: utf-8 -*-
+"""Non-interactive scaffolding pipeline
+
+``Scaffolder`` keeps everything that can be reused between projects: the
+catalog index, the results of the toolchain probes, the wheelhouse, source
+cache and mirrors and the run history. The command line asks its
+questions and then drives the stages one by one; ``lazypony serve`` keeps a
+single Scaffolder warm and runs whole scaffolds from requests.
+"""
+import os
+import re
+import time
+import random
+import getpass
+from functools import wraps
+from os.path import join as j
+
+import settings
+from libs import create_dirs, get_source, get_sparse, get_dependencies, get_layout, clean_packages_names
+from catalog import CatalogIndex
+from checkpoint import Journal
+from databases import DEFAULTS as DATABASE_DEFAULTS, databases
+from environment import InstalledIndex
+from history import History
+from fetch import SourceCache, job_name
+from jobs import DONE, CANCELLED, Job, JobRunner
+from lockfile import Lockfile
+from manifest import Manifest
+from mirrors import MirrorManager
+from precompile import DIRECTORIES, precompile
+from startup import python
+from merge import LISTS, fragment, files, settings_order, combine, merge, expensive, format_list
+from verify import PRODUCTION, TEST, check_settings
+from wheelhouse import Wheelhouse, requirement, write_requirements
+
+__all__ = ['REQUIRED', 'ScaffoldError', 'Plan', 'Scaffolder', 'default_answers']
+
+# Installed into every project: django and the server the generated
+# gunicorn config is for
+REQUIRED = ('django', 'gunicorn')
+
+# Middleware left out of the test settings, a page cached by one test would
+# be served to the next
+TEST_EXCLUDED_MIDDLEWARE = (
+    'django.middleware.cache.UpdateCacheMiddleware',
+    'django.middleware.cache.FetchFromCacheMiddleware',
+)
+
+
+class ScaffoldError(Exception):
+    pass
+
+
+def _print(line):
+    print line
+
+
+def current_user():
+    return os.environ.get("USERNAME") or os.environ.get("USER") or getpass.getuser()
+
+
+def default_answers():
+    answers = {
+        'username': current_user(),
+        'usernames': '',
+        'time_zone': 'Europe/Moscow',
+        'language_code': 'ru-ru',
+        'site_http': 'http://example.com/',
+    }
+    answers.update(DATABASE_DEFAULTS)
+    return answers
+
+
+def secret_key():
+    chars = 'abcdefghijklmnopqrstuvwxyz0123456789!@#$%^&*(-_=+)'
+    return ''.join([random.SystemRandom().choice(chars) for i in range(50)])
+
+
+def mreplace(str, dt):
+    for key in dt:
+        str = str.replace("{{ %s }}" % key, dt[key])
+    return str
+
+
+def template(filename_from, dt):
+    return mreplace(open(filename_from,"r").read(), dt)
+
+
+class Plan(object):
+    """Resolved install plan.
+
+    packages, dependencies
+        Requested package names (the ``REQUIRED`` ones first) and the ones only pulled
+        in as dependencies.
+    sources, sparse, depends
+        Package name -> ``SOURCE`` tuple, sparse subpaths, names of the
+        packages it depends on.
+    trees, digests
+        Package name -> expected tree hash and requirement line ->
+        expected wheel hash, known when the plan comes from a lockfile.
+    """
+
+    def __init__(self, packages, dependencies, sources, sparse, depends, trees={}, digests={}):
+        self.packages = list(packages)
+        self.dependencies = list(dependencies)
+        self.sources = sources
+        self.sparse = sparse
+        self.depends = depends
+        self.trees = dict(trees)
+        self.digests = dict(digests)
+
+    @property
+    def names(self):
+        """Every package in install order."""
+        return self.dependencies + self.packages
+
+    @property
+    def installable(self):
+        """Packages with a source, the others ship with django."""
+        return [p for p in self.names if self.sources[p]]
+
+    @classmethod
+    def resolve(cls, packages):
+        """Plan for the catalog ``packages``, the ``REQUIRED`` ones and their dependencies."""
+        packages = clean_packages_names(packages)
+        packages = list(REQUIRED) + [p for p in packages if p not in REQUIRED]
+
+        dependencies = []
+        try:
+            queue = list(packages)
+            while queue:
+                for d in get_dependencies(queue.pop(0)):
+                    if d not in packages and d not in dependencies:
+                        dependencies.append(d)
+                        queue.append(d)
+            names = dependencies + packages
+            return cls(packages, dependencies,
+                       dict((p, get_source(p)) for p in names),
+                       dict((p, get_sparse(p)) for p in names),
+                       dict((p, get_dependencies(p)) for p in names))
+        except ImportError, e:
+            raise ScaffoldError("Couldn't find package: %s" % e)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Plan from the output of ``as_dict``, JSON decoded or not."""
+        return cls(data['packages'], data['dependencies'],
+                   dict((p, s and tuple(s)) for p, s in data['sources'].items()),
+                   dict((p, tuple(s)) for p, s in data['sparse'].items()),
+                   dict((p, tuple(d)) for p, d in data['depends'].items()),
+                   data.get('trees', {}), data.get('digests', {}))
+
+    def as_dict(self):
+        return {
+            'packages': self.packages,
+            'dependencies': self.dependencies,
+            'sources': dict((p, s and list(s)) for p, s in self.sources.items()),
+            'sparse': dict((p, list(s)) for p, s in self.sparse.items()),
+            'depends': dict((p, list(d)) for p, d in self.depends.items()),
+            'trees': self.trees,
+            'digests': self.digests,
+        }
+
+    @classmethod
+    def from_lockfile(cls, lockfile):
+        return cls(lockfile.names(dependency=False), lockfile.names(dependency=True),
+                   lockfile.sources(), lockfile.sparse(), lockfile.depends(),
+                   lockfile.trees(), lockfile.digests())
+
+
+def _stage(name):
+    """Records the duration of a Scaffolder stage in the run history."""
+    def decorator(method):
+        @wraps(method)
+        def timed(self, *args, **kwargs):
+            started = time.time()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.history.stage(name, time.time() - started)
+        return timed
+    return decorator
+
+
+class Scaffolder(object):
+    """Pipeline stages sharing caches between scaffolds.
+
+    root
+        Directory holding lazypony's ``res`` and ``packages``.
+    log
+        Callable receiving progress lines, by default they are printed.
+    """
+
+    def __init__(self, root=None, log=None):
+        self.root = root or settings.ROOT
+        self.log = log or _print
+        self.tools = None
+        self.wheelhouse = Wheelhouse(settings.WHEELHOUSE)
+        mirrors = settings.MIRROR_ROOT and MirrorManager(settings.MIRROR_ROOT, settings.URL_REWRITES)
+        self.source_cache = SourceCache(settings.SOURCES, mirrors, settings.URL_REWRITES)
+        self.history = History(settings.HISTORY)
+        self.peers = None
+        if settings.PEERS:
+            from peers import Peers
+            self.peers = Peers(settings.PEERS, self.wheelhouse, self.source_cache,
+                               settings.WORKERS, log=lambda line: self.log(line))
+        self._catalog = None
+        self._signature = None
+
+    @property
+    def catalog(self):
+        """Catalog index, reloaded when the catalog changed on disk."""
+        if self._catalog is None or self._catalog.signature() != self._signature:
+            self._catalog = CatalogIndex(j(self.root, 'packages'), settings.CATALOG_INDEX)
+            self._signature = self._catalog.signature()
+        return self._catalog
+
+    def runner(self, log=None):
+        job_log = log and (lambda job, line: log("[%s] %s" % (job.name, line.rstrip("\n"))))
+        return JobRunner(settings.WORKERS, log=job_log, timings=self.history)
+
+    def probe(self):
+        """Versions of pip and virtualenv, probed once per Scaffolder."""
+        if self.tools is None:
+            runner = self.runner(self.log)
+            pip = runner.add(Job('pip', ['pip', '--version'], capture=True))
+            virtualenv = runner.add(Job('virtualenv', ['virtualenv', '--version'], capture=True))
+            runner.run()
+            if not pip.ok:
+                raise ScaffoldError("pip not installed")
+            if not virtualenv.ok:
+                raise ScaffoldError("virtualenv not installed")
+            self.tools = {
+                'pip': re.search('pip (.*?) ', pip.text()).group(1),
+                'virtualenv': virtualenv.text().strip(),
+            }
+        return self.tools
+
+    def journal(self, output_dir):
+        """Checkpoint journal of ``output_dir``.
+
+        The toolchain versions probed by an interrupted run are taken over.
+        """
+        journal = Journal(output_dir)
+        if self.tools is None and journal.tools:
+            self.tools = journal.tools
+        return journal
+
+    def prepare(self, output_dir, update=False, resume=False):
+        """Creates the project directories, returns the project manifest.
+
+        Starts a new run in the history. When resuming the directories may
+        exist already.
+        """
+        self.history.start(os.path.abspath(output_dir))
+        if not create_dirs(output_dir, update or resume):
+            raise ScaffoldError('Could\'t create directory "%s"' % output_dir)
+        manifest = Manifest(output_dir)
+        if update and not manifest.exists():
+            raise ScaffoldError('No lazypony project in "%s"' % output_dir)
+        return manifest
+
+    @_stage('render')
+    def render(self, output_dir, answers, packages=('django',)):
+        """Generated files (relative path -> content) and settings variants.
+
+        ``packages`` are the names of the installed packages, their
+        settings are merged into the generated ones.
+        """
+        answers = dict(default_answers().items() + answers.items())
+        res = j(self.root, 'res')
+        packages_dir = j(self.root, 'packages')
+        user_template = j(res, 'user_settings.py')
+        development = {'debug': 'True', 'static_serve': 'True', 'site_http': 'http://127.0.0.1:8000/'}
+        production = {'debug': 'False', 'static_serve': 'False', 'site_http': answers['site_http']}
+
+        rendered = {}
+        additional_usernames = [u.strip() for u in answers['usernames'].split(",") if u.strip()]
+        variants = []
+        for name in [answers['username']] + additional_usernames:
+            if name not in variants + [TEST, PRODUCTION]:
+                variants.append(name)
+        variants.append(PRODUCTION)
+        for name in variants:
+            try:
+                block = databases(answers, name, output_dir+os.sep)
+            except ValueError, e:
+                raise ScaffoldError(str(e))
+            rendered[j('project', "settings_%s.py" % (name,))] = template(user_template,
+                dict(name == PRODUCTION and production or development, databases=block))
+
+        fragments = [p for p in settings_order(packages) if fragment(packages_dir, p)]
+        for p in fragments:
+            rendered[j('project', 'conf', 'packages', "%s.py" % p)] = open(fragment(packages_dir, p)).read()
+        for p in settings_order(packages):
+            rendered.update(files(packages_dir, p))
+
+        # only the rendered packages are read, a locked plan never imports
+        # the whole catalog
+        try:
+            entries = dict((p, get_layout(p)) for p in packages)
+        except ImportError, e:
+            raise ScaffoldError("Couldn't find package: %s" % e)
+        first = sum([entries.get(p, {}).get('first', []) for p in packages], [])
+        last = sum([entries.get(p, {}).get('last', []) for p in packages], [])
+        constraints = combine([entries.get(p, {}).get('order', {}) for p in settings_order(packages)])
+        def lists(exclude=(), middleware_excluded=()):
+            try:
+                merged = merge(packages_dir, packages, exclude, first, last, constraints)
+            except ValueError, e:
+                raise ScaffoldError(str(e))
+            merged['MIDDLEWARE_CLASSES'] = [m for m in merged['MIDDLEWARE_CLASSES'] if m not in middleware_excluded]
+            return dict((setting.lower(), format_list(merged[setting])) for setting in LISTS)
+
+        processors = merge(packages_dir, packages)['TEMPLATE_CONTEXT_PROCESSORS']
+        for name, cost in expensive(processors, constraints):
+            self.log("Warning: %s costs %s and runs for every RequestContext, "
+                     "consider a template tag instead" % (name, cost))
+
+        project = {
+            'document_root' : output_dir+os.sep,
+            'project_name' : 'project',
+        }
+        rendered[j('project', "settings.py")] = template(j(res, 'base_settings.py'), dict(project,
+            time_zone=answers['time_zone'],
+            language_code=answers['language_code'],
+            secret_key=answers['secret_key'],
+            packages=repr(tuple(fragments)),
+            **lists()
+        ))
+        dev_only = [p for p in packages if entries.get(p, {}).get('dev_only')]
+        rendered[j('project', "settings_%s.py" % TEST)] = template(j(res, 'test_settings.py'),
+                                                                      lists(dev_only, TEST_EXCLUDED_MIDDLEWARE))
+        rendered[j('project', "wsgi.py")] = template(j(res, 'wsgi.py'), project)
+        rendered[j('project', 'conf', 'platform', "gunicorn.py")] = template(j(res, 'gunicorn.py'), project)
+        return rendered, variants + [TEST]
+
+    @_stage('write')
+    def write(self, manifest, rendered):
+        written, removed, edited = manifest.apply(rendered)
+        for path in written: self.log("Written %s" % path)
+        for path in removed: self.log("Removed %s" % path)
+        for path in edited: self.log("Skipped %s, edited by hand" % path)
+        manifest.save()
+        return written, removed, edited
+
+    @_stage('check')
+    def check(self, output_dir, variants):
+        """Imports the settings variants, returns the names of broken ones."""
+        broken = []
+        for job in check_settings(j(output_dir, 'project'), variants):
+            variant = job.name.split('_', 1)[1]
+            self.log("settings for %s don't import:" % variant)
+            self.log(job.text())
+            broken.append(variant)
+        return broken
+
+    def _failed(self, jobs):
+        if [job for job in jobs.values() if not job.ok]:
+            failed = [job.name for job in jobs.values() if job.state not in (DONE, CANCELLED)]
+            raise ScaffoldError("Failed: %s" % ", ".join(sorted(failed)))
+
+    def _build_jobs(self, runner, plan, sources):
+        """Adds fetch and wheel jobs for ``sources`` missing from the wheelhouse.
+
+        Returns the names of the packages whose tree is fetched.
+        """
+        if self.peers:
+            self._pull(plan, sources)
+        trees, fetching = {}, {}
+        missing = self.wheelhouse.missing(sources, plan.digests)
+        cached = 0
+        for p in plan.installable:
+            source = plan.sources[p]
+            if source not in missing: continue
+            jobs = self.source_cache.fetch_jobs(source, plan.sparse[p], settings.JOB_TIMEOUT, plan.trees.get(p))
+            for job in jobs:
+                runner.add(job)
+            cached += not jobs
+            trees[requirement(source)] = self.source_cache.tree(source, plan.sparse[p])
+            if job_name(source) in runner.jobs:
+                fetching[requirement(source)] = (job_name(source),)
+
+        for job in self.wheelhouse.build_jobs(sources, timeout=settings.JOB_TIMEOUT, digests=plan.digests,
+                                              trees=trees, depends=fetching):
+            runner.add(job)
+        self.history.packages(sources)
+        self.history.cache('wheels', len(sources) - len(missing), len(missing))
+        self.history.cache('sources', cached, len(missing) - cached)
+        return [p for p in plan.installable if requirement(plan.sources[p]) in fetching]
+
+    def _pull(self, plan, sources):
+        """Takes the wheels or trees of ``sources`` the cache peers have."""
+        missing = self.wheelhouse.missing(sources, plan.digests)
+        wanted = [(plan.sources[p], plan.sparse[p]) for p in plan.installable if plan.sources[p] in missing]
+        if not wanted:
+            return
+        pulled = self.peers.pull(wanted, plan.digests)
+        if pulled['wheels'] or pulled['trees']:
+            self.log("Took %s wheels and %s source trees from cache peers" % (
+                len(pulled['wheels']), len(pulled['trees'])))
+        self.history.cache('peers', len(pulled['wheels']) + len(pulled['trees']), pulled['missing'])
+
+    def _record_trees(self, plan, fetched):
+        """Records the hashes of the trees fetched, raises ScaffoldError when
+        one differs from the hash the lockfile has for it, like wheels do."""
+        mismatched = []
+        for p in plan.installable:
+            if p in fetched or not plan.trees.get(p):
+                tree = self.source_cache.cached(plan.sources[p], plan.sparse[p])
+                if not tree:
+                    continue
+                digest = self.source_cache.digest(tree)
+                if plan.trees.get(p) and digest != plan.trees[p]:
+                    mismatched.append("%s (locked %s, fetched %s)" % (p, plan.trees[p], digest))
+                else:
+                    plan.trees[p] = digest
+        if mismatched:
+            raise ScaffoldError("Fetched sources don't match the lockfile: %s; the pinned revisions "
+                                "changed at their origin, resolve again without the lockfile to accept "
+                                "them" % ", ".join(mismatched))
+
+    @_stage('fetch')
+    def fetch(self, plan):
+        """Fetches and builds the wheels of ``plan`` missing from the wheelhouse.
+
+        Returns the names of the packages fetched and built, raises
+        ScaffoldError when a job fails.
+        """
+        runner = self.runner(self.log)
+        fetched = self._build_jobs(runner, plan, [plan.sources[p] for p in plan.installable])
+        self._failed(runner.run())
+        self._record_trees(plan, fetched)
+        return {
+            'fetched': fetched,
+            'built': [p for p in plan.installable if 'wheel:%s' % plan.sources[p][2] in runner.jobs],
+        }
+
+    @_stage('install')
+    def install(self, output_dir, plan, manifest=None, lockfile=None, journal=None):
+        """Fetches, builds and installs what the project is missing.
+
+        Returns the names of the packages installed and of the ones found
+        installed already, raises ScaffoldError when a job fails. Packages
+        the ``journal`` has installed count as installed already, the jobs
+        completed are recorded in it.
+        """
+        manifest = manifest or Manifest(output_dir)
+        lockfile = lockfile or Lockfile(output_dir)
+        self.log("Generating requirements.pip file")
+        sources = [plan.sources[p] for p in plan.installable]
+        write_requirements(j(output_dir, 'requirements.pip'), sources)
+
+        # The environment decides what is installed, it may have been
+        # recreated since the manifest was written
+        env_dir = j(output_dir, 'env')
+        installed = InstalledIndex(env_dir)
+        resumed = journal and os.path.isdir(env_dir) and \
+            [plan.sources[p] for p in journal.installed() if plan.sources.get(p)] or []
+        satisfied = [s for s in sources if s in resumed or installed.satisfied(s, self.wheelhouse, plan.digests.get(requirement(s)))]
+        for s in satisfied: self.log("%-21s    %-20s    already installed" % (s[2], s[3]))
+        self.history.cache('installed', len(satisfied), len(sources) - len(satisfied))
+        sources = [s for s in sources if s not in satisfied]
+
+        runner = self.runner(self.log)
+        if not os.path.isdir(env_dir):
+            runner.add(Job('virtualenv', ['virtualenv', env_dir], timeout=settings.JOB_TIMEOUT))
+        fetched = self._build_jobs(runner, plan, sources)
+
+        # Every package is installed as soon as its wheel and the packages it
+        # depends on are in place, the longest chains first
+        pip = j(env_dir, 'bin', 'pip')
+        installing = dict((plan.sources[p][2], p) for p in plan.installable if plan.sources[p] in sources)
+        for egg, p in installing.items():
+            depends = [name for name in ('virtualenv', 'wheel:%s' % egg) if name in runner.jobs]
+            depends += ['install:%s' % plan.sources[d][2] for d in plan.depends[p]
+                        if plan.sources.get(d) and plan.sources[d][2] in installing]
+            runner.add(self.wheelhouse.install_job(pip, plan.sources[p], depends, settings.JOB_TIMEOUT,
+                                                   plan.digests.get(requirement(plan.sources[p]))))
+
+        jobs = runner.run()
+        if journal is not None:
+            journal.record_jobs(jobs.values(), dict((plan.sources[p][2], p) for p in plan.installable))
+        self._failed(jobs)
+        self._record_trees(plan, fetched)
+
+        manifest.packages = plan.names
+        manifest.sources = [requirement(plan.sources[p]) for p in plan.installable]
+        manifest.save()
+
+        lockfile.lock(plan.packages, plan.dependencies, plan.sources, self.wheelhouse,
+                      plan.sparse, plan.trees, plan.depends, plan.digests)
+        lockfile.save()
+        return {
+            'installed': [p for p in plan.installable if plan.sources[p] in sources],
+            'satisfied': [p for p in plan.installable if plan.sources[p] in satisfied],
+            'fetched': fetched,
+        }
+
+    @_stage('precompile')
+    def precompile(self, output_dir):
+        """Byte-compiles the project's own and bundled sources."""
+        result = precompile([j(output_dir, d) for d in DIRECTORIES], python(output_dir))
+        self.log("Compiled %s files, %s were up to date" % (result['compiled'], result['current']))
+        for filename, error in result['failed']:
+            self.log("Couldn't compile %s: %s" % (filename, error))
+        return result
+
+    def scaffold(self, output_dir, packages=(), answers={}, update=False, use_lock=True):
+        """Runs every stage without asking anything.
+
+        ``packages`` is ignored when the project has a lockfile and
+        ``use_lock`` is set. Returns a dictionary describing the result.
+        A scaffold interrupted in ``output_dir`` is resumed with the answers
+        and packages it had.
+        """
+        journal = self.journal(output_dir)
+        resume = journal.exists()
+        journal.tools = self.probe()
+        manifest = self.prepare(output_dir, update, resume)
+        if journal.answers is None:
+            manifest.answers.update(answers)
+            manifest.answers.setdefault('secret_key', secret_key())
+            journal.answers = manifest.answers
+        manifest.answers = journal.answers
+
+        lockfile = Lockfile(output_dir)
+        if journal.plan is not None:
+            plan = Plan.from_dict(journal.plan)
+        elif lockfile.exists() and use_lock:
+            plan = Plan.from_lockfile(lockfile)
+        else:
+            packages = list(packages)
+            if update:
+                packages += [p for p in manifest.packages if p not in packages]
+            plan = Plan.resolve(packages)
+        journal.plan = plan.as_dict()
+        journal.save()
+        if resume:
+            self.log("Resuming the scaffold interrupted after: %s" % (", ".join(sorted(journal.stages)) or "-"))
+
+        if not journal.done('write'):
+            rendered, variants = self.render(output_dir, manifest.answers, plan.names)
+            written, removed, edited = self.write(manifest, rendered)
+            journal.complete('write', {'variants': variants, 'written': written,
+                                       'removed': removed, 'edited': edited})
+        if not journal.done('check'):
+            journal.complete('check', self.check(output_dir, journal.stages['write']['variants']))
+        if not journal.done('install'):
+            journal.complete('install', self.install(output_dir, plan, manifest, lockfile, journal))
+        compiled = self.precompile(output_dir)
+        journal.remove()
+        return {
+            'output_dir': output_dir,
+            'packages': plan.names,
+            'installed': journal.stages['install']['installed'],
+            'written': journal.stages['write']['written'],
+            'removed': journal.stages['write']['removed'],
+            'edited': journal.stages['write']['edited'],
+            'broken_settings': journal.stages['check'],
+            'compiled': compiled['compiled'],
+        }
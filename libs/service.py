@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""lazypony as a long running service on a Unix socket
+
+The server keeps one ``Scaffolder`` warm: catalog index, toolchain probes,
+cache handles and timings survive between requests, and so do the catalog
+modules already imported. A request is a single line of JSON::
+
+    {"output_dir": "/srv/site", "packages": ["south"], "answers": {},
+     "update": false, "lock": true}
+
+The server answers with JSON lines, ``{"log": ...}`` for progress and a final
+``{"result": ...}`` or ``{"error": ...}``. Scaffolds are run one at a time
+since they share the caches.
+"""
+import os
+import sys
+import json
+import socket
+import SocketServer
+
+from scaffold import Scaffolder, ScaffoldError
+
+__all__ = ['serve', 'submit']
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+
+    def send(self, **message):
+        self.wfile.write(json.dumps(message) + "\n")
+        self.wfile.flush()
+
+    def handle(self):
+        scaffolder = self.server.scaffolder
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError, e:
+            self.send(error="Bad request: %s" % e)
+            return
+
+        scaffolder.log = lambda line: self.send(log=line)
+        try:
+            result = scaffolder.scaffold(os.path.abspath(request['output_dir']),
+                                         request.get('packages', ()),
+                                         request.get('answers', {}),
+                                         request.get('update', False),
+                                         request.get('lock', True))
+        except socket.error:
+            pass
+        except Exception, e:
+            # the client gets the reason, whatever failed
+            self.send(error=str(e) or e.__class__.__name__)
+        else:
+            self.send(result=result)
+
+
+def serve(socket_path, root=None):
+    """Serves scaffold requests on ``socket_path`` until interrupted."""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = SocketServer.UnixStreamServer(socket_path, RequestHandler)
+    server.scaffolder = Scaffolder(root)
+    server.scaffolder.probe()
+    server.scaffolder.catalog
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def submit(socket_path, request, out=sys.stdout):
+    """Sends ``request`` to the server, writes progress to ``out``.
+
+    Returns the result dictionary, raises ScaffoldError with the server's
+    error.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    try:
+        client.sendall(json.dumps(request) + "\n")
+        for line in client.makefile():
+            message = json.loads(line)
+            if 'log' in message:
+                out.write(message['log'] + "\n")
+                out.flush()
+            elif 'error' in message:
+                raise ScaffoldError(message['error'])
+            else:
+                return message['result']
+    finally:
+        client.close()
+    raise ScaffoldError("Connection closed by the server")
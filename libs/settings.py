@@ -1,6 +1,56 @@
-# To change this template, choose Tools | Templates
-# and open the template in the editor.
+# -*- coding: utf-8 -*-
+"""LazyPony configuration
+"""
+import os
 
-__author__="PyKaB"
-__date__ ="$17.08.2010 10:42:40$"
+# Directory holding lazypony's "res" and "packages", set by the zipapp to where
+# it extracted them
+ROOT = os.environ.get('LAZYPONY_ROOT') or os.getcwd()
 
+# Maximum number of external commands (pip, virtualenv, vcs) running at once
+WORKERS = int(os.environ.get('LAZYPONY_WORKERS', 4))
+
+# Seconds after which a single external command is killed
+JOB_TIMEOUT = 30 * 60
+
+# Per-user cache shared by every generated project
+CACHE_ROOT = os.path.expanduser(os.environ.get('LAZYPONY_CACHE', '~/.lazypony'))
+
+# Wheels built from pinned package sources
+WHEELHOUSE = os.path.join(CACHE_ROOT, 'wheels')
+
+# Source trees fetched at their pinned revisions
+SOURCES = os.path.join(CACHE_ROOT, 'sources')
+
+# Bare mirrors of git and hg sources, None to always fetch from the origin
+MIRROR_ROOT = os.environ.get('LAZYPONY_MIRRORS', os.path.join(CACHE_ROOT, 'mirrors'))
+
+# Url prefix -> replacement, e.g. to fetch from an internal mirror:
+# {'http://bitbucket.org/': 'file:///srv/mirrors/bitbucket/'}
+URL_REWRITES = {}
+
+# Base urls of "lazypony cache-serve" on other nodes, asked before the origin,
+# e.g. LAZYPONY_PEERS=http://builder1:8765,http://builder2:8765
+PEERS = [url for url in os.environ.get('LAZYPONY_PEERS', '').split(',') if url]
+
+# Port "lazypony cache-serve" listens on
+PEER_PORT = int(os.environ.get('LAZYPONY_PEER_PORT', 8765))
+
+# Durations of previous stages and jobs and cache hit rates
+HISTORY = os.path.join(CACHE_ROOT, 'history.sqlite')
+
+# Lockfile with the resolved install plan, in the project directory
+LOCK_NAME = 'lazypony.lock'
+
+# Search index over the package catalog
+CATALOG_INDEX = os.path.join(CACHE_ROOT, 'catalog.json')
+
+# Named package sets offered by the package selection screen
+PRESETS = {
+    'admin': ['django-grappelli', 'grappelli-admin-tools', 'django-filebrowser'],
+    'dev': ['django-debug-toolbar', 'django-extensions'],
+    'content': ['django-mptt', 'django-tagging', 'easyl-thumbnails'],
+}
+
+# Unix socket of "lazypony serve"
+SOCKET = os.environ.get('LAZYPONY_SOCKET', os.path.join(CACHE_ROOT, 'lazypony.sock'))
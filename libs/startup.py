@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Startup import-time report of a generated project
+
+The project is booted a few times by ``importtrace.py`` in its own
+interpreter. The cumulative import time of every ``INSTALLED_APPS`` entry is
+the time of the imports entering its modules from outside of them, so an app
+pulling in a heavy library pays for it. Catalog packages are charged for the
+apps they add. The median over the runs is compared with a baseline stored in
+the project.
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from os.path import join as j
+
+from catalog import settings_names
+from merge import fragment
+
+__all__ = ['BASELINE_NAME', 'trace', 'attribute', 'by_package', 'report',
+           'load_baseline', 'save_baseline']
+
+BASELINE_NAME = 'lazypony.startup'
+
+TRACER = j(os.path.dirname(os.path.abspath(__file__)), 'importtrace.py')
+
+
+def python(output_dir):
+    """Interpreter of the project's virtualenv, falling back to this one."""
+    env_python = j(output_dir, 'env', 'bin', 'python')
+    return os.path.exists(env_python) and env_python or sys.executable
+
+
+def _tracer():
+    """Path of the tracer, written to a temporary file when running from the zipapp."""
+    if os.path.isfile(TRACER):
+        return TRACER
+    handle, tracer = tempfile.mkstemp(suffix='.py')
+    os.write(handle, __loader__.get_data(TRACER))
+    os.close(handle)
+    return tracer
+
+
+def trace(output_dir, interpreter=None):
+    """Result of one traced start of the project."""
+    handle, output = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    tracer = _tracer()
+    try:
+        code = subprocess.call([interpreter or python(output_dir), '-B', tracer,
+                                j(output_dir, 'project'), output])
+        if code:
+            raise RuntimeError("Import tracer exited with code %s" % code)
+        return json.load(open(output))
+    finally:
+        os.remove(output)
+        if tracer != TRACER:
+            os.remove(tracer)
+
+
+def _inside(module, prefix):
+    return module == prefix or module.startswith(prefix + '.')
+
+
+def attribute(result):
+    """App -> cumulative seconds of its imports."""
+    times = {}
+    for app in result['apps']:
+        times[app] = sum([seconds for name, importer, seconds in result['imports']
+                          if _inside(name, app) and not _inside(importer, app)])
+    return times
+
+
+def by_package(times, packages_dir, packages):
+    """Catalog package -> seconds of the apps it adds."""
+    charged = {}
+    for name in packages:
+        filename = fragment(packages_dir, name)
+        apps = filename and settings_names(filename, 'INSTALLED_APPS') or []
+        charged[name] = sum([times.get(app, 0) for app in apps])
+    return charged
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def report(output_dir, packages_dir, packages, runs=3):
+    """Median ``total``, per-app and per-package seconds over ``runs`` starts.
+
+    ``errors`` holds the stages which failed to import in the last run.
+    """
+    results = [trace(output_dir) for i in range(max(1, runs))]
+    apps = [attribute(result) for result in results]
+    times = dict((app, _median([a.get(app, 0) for a in apps])) for app in results[-1]['apps'])
+    return {
+        'total': _median([result['total'] for result in results]),
+        'apps': times,
+        'packages': by_package(times, packages_dir, packages),
+        'errors': results[-1]['errors'],
+    }
+
+
+def load_baseline(output_dir):
+    filename = j(output_dir, BASELINE_NAME)
+    if not os.path.exists(filename):
+        return None
+    try:
+        return json.load(open(filename))
+    except ValueError:
+        return None
+
+
+def save_baseline(output_dir, result):
+    file = open(j(output_dir, BASELINE_NAME), "w")
+    json.dump(result, file, indent=1, sort_keys=True)
+    file.close()
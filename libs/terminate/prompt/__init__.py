@@ -4,10 +4,12 @@
 import sys
 import os
 import os.path
+import re
 from terminate.abstract import color, stdout, stderr
 
 __all__ = ["rl", "casts", "queries",
-           "input_object","query","query_list","file_chooser","error_message"]
+           "input_object","query","query_list","file_chooser","error_message",
+           "multi_select"]
 
 # this constant is here because float() and int() give error messages
 # that would confuse most sane users.
@@ -172,4 +174,84 @@ def file_chooser(prompt_text = "Enter File: ", default=None, filearg=[], filekwa
         try:
             return open(f, *filearg, **filekwarg)
         except IOError, e:
-            stdout.write(ERROR_MESSAGE % ("unable to open %s : %s" % (f, e)))
\ No newline at end of file
+            stdout.write(ERROR_MESSAGE % ("unable to open %s : %s" % (f, e)))
+
+SELECT_HELP = ("Type words to filter, numbers or ranges (2 5-7) to toggle shown "
+               "items, '*' to toggle all shown, '@preset' to add a preset, "
+               "'-' to clear the selection, empty line when done" + os.linesep)
+
+def multi_select(prompt_text, items, search=None, presets={}, selected=()):
+    """Lets the user pick any number of items from a long list.
+    
+    items
+        A list of strings to choose from.
+    search
+        A callable taking the filter text and returning the matching items,
+        best first. By default items containing the text are shown.
+    presets
+        A dictionary of named lists of items, added with '@name'.
+    selected
+        Items selected from the start.
+    
+    Returns the list of selected items, in the order of ``items``.
+    """
+    if search is None:
+        search = lambda text: [i for i in items if text.lower() in i.lower()]
+    try:
+        import readline
+        import rl
+        completer = rl.ListCompleter(list(items) + ['@' + p for p in presets], True)
+        readline.parse_and_bind("tab: complete")
+        readline.set_completer(completer.complete)
+    except ImportError:
+        pass
+    chosen = set(selected)
+    shown = list(items)
+    stdout.write(prompt_text + os.linesep + SELECT_HELP)
+    while True:
+        for n, item in enumerate(shown):
+            mark = item in chosen and (color('bright', 'green') + '*' + color('default')) or ' '
+            stdout.write('%s %3d. %s%s' % (mark, n + 1, item, os.linesep))
+        if presets:
+            stdout.write('Presets: ' + ', '.join(['@' + p for p in sorted(presets)]) + os.linesep)
+        try:
+            t = raw_input('%d selected> ' % len(chosen)).strip()
+        except EOFError:
+            t = ''
+        if t == '':
+            return [i for i in items if i in chosen]
+        if t == '*':
+            if set(shown) <= chosen: chosen -= set(shown)
+            else: chosen |= set(shown)
+        elif t == '-':
+            chosen.clear()
+        elif t.startswith('@'):
+            if t[1:] in presets:
+                chosen |= set([i for i in presets[t[1:]] if i in items])
+            else:
+                stdout.write(ERROR_MESSAGE % ("Unknown preset '%s'" % t[1:]))
+        elif re.match(r'^[\d\s,-]+$', t):
+            try:
+                for n in _numbers(t, len(shown)):
+                    chosen ^= set([shown[n - 1]])
+            except ValueError, details:
+                stdout.write(ERROR_MESSAGE % details)
+        else:
+            shown = search(t)
+            if not shown:
+                stdout.write(ERROR_MESSAGE % ("Nothing matches '%s'" % t))
+                shown = list(items)
+
+def _numbers(text, count):
+    """Parses '1 3,5-7' into [1, 3, 5, 6, 7]"""
+    numbers = []
+    for part in re.split(r'[\s,]+', text.strip()):
+        if '-' in part:
+            start, end = [int(n) for n in part.split('-', 1)]
+            numbers.extend(range(start, end + 1))
+        elif part:
+            numbers.append(int(part))
+    for n in numbers:
+        if n < 1 or n > count:
+            raise ValueError("There is no item %d" % n)
+    return numbers
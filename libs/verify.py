@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Checks that the generated settings import
+
+Every settings variant is imported the way Django would on that machine:
+``settings`` picks ``settings_<user>`` by the USER environment variable and
+falls back to ``settings_production``. Each variant is imported in its own
+process so they don't share module state, and all of them run at once.
+"""
+import os
+import sys
+
+from jobs import Job, JobRunner
+
+__all__ = ['PRODUCTION', 'TEST', 'settings_jobs', 'check_settings']
+
+# Variant name standing for the production configuration
+PRODUCTION = 'production'
+
+# Variant name of the test settings, built on top of the others
+TEST = 'test'
+
+
+def settings_jobs(project_dir, variants, python=sys.executable):
+    jobs = []
+    for variant in variants:
+        env = dict(os.environ)
+        env.pop('USERNAME', None)
+        # no settings_<user> module for this user, so production is used
+        env['USER'] = variant in (PRODUCTION, TEST) and '__production__' or variant
+        # the variant first: settings hides its ImportError behind the fallback
+        code = 'import settings_%s, settings' % variant
+        jobs.append(Job('check:settings_%s' % variant, [python, '-B', '-c', code],
+                        cwd=project_dir, env=env, capture=True))
+    return jobs
+
+
+def check_settings(project_dir, variants, python=sys.executable):
+    """Imports every variant in parallel, returns the jobs which failed."""
+    runner = JobRunner(len(variants))
+    for job in settings_jobs(project_dir, variants, python):
+        runner.add(job)
+    return [job for job in runner.run().values() if not job.ok]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Shared wheelhouse for pinned package sources
+
+Every ``SOURCE`` is built into a wheel once and kept in a wheelhouse shared by
+all projects. Packages are then installed from the wheelhouse only
+(``--no-index --find-links --no-deps``), so installs work offline, don't
+rebuild anything that was built for a previous project and don't resolve
+anything: the order is given by the jobs' dependencies.
+
+Wheel builds aren't reproducible, so every wheel is kept under its hash
+(``<sha256 prefix>/<wheel name>``) and a requirement may have several: the
+one a lockfile pins is served as long as it is in the wheelhouse, a newly
+built one doesn't replace it.
+"""
+import os
+import json
+import shutil
+from os.path import join as j
+
+from cache import CacheManifest, file_digest
+from jobs import Job
+
+__all__ = ['requirement', 'write_requirements', 'Wheelhouse']
+
+
+def requirement(source):
+    """Pip requirement line for a catalog ``SOURCE`` tuple."""
+    vcs, url, egg, rev = source
+    return "%s+%s@%s#egg=%s" % (vcs, url, rev, egg)
+
+
+def write_requirements(filename, sources):
+    file = open(filename, "w")
+    for source in sources:
+        file.write("-e %s\n" % requirement(source))
+    file.close()
+
+
+class Wheelhouse(object):
+    """Directory of built wheels with an index by requirement line.
+
+    index
+        Requirement line -> [sha256, path relative to the wheelhouse] of
+        its wheels, the latest one last.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_file = j(path, 'index.json')
+        self.build_dir = j(path, '.build')
+        self.index = {}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        if os.path.exists(self.index_file):
+            self.index = json.load(open(self.index_file))
+        for req, wheels in self.index.items():
+            # a single wheel name, as written before wheels were kept by hash
+            if isinstance(wheels, basestring):
+                filename = j(self.path, wheels)
+                self.index[req] = os.path.exists(filename) and [[self.digest(filename), wheels]] or []
+
+    def save(self):
+        file = open(self.index_file, "w")
+        json.dump(self.index, file, indent=1, sort_keys=True)
+        file.close()
+
+    def wheels(self, req):
+        """(sha256, path) of the intact wheels of requirement line ``req``, the latest last."""
+        wheels = []
+        for sha256, relative in self.index.get(req, ()):
+            filename = j(self.path, relative)
+            if os.path.exists(filename) and self.digest(filename) == sha256:
+                wheels.append((sha256, filename))
+        return wheels
+
+    def entries(self):
+        """(requirement line, sha256, path) of every intact wheel."""
+        return [(req, sha256, filename) for req in sorted(self.index)
+                for sha256, filename in self.wheels(req)]
+
+    def wheel(self, source, digest=None):
+        """Path to the latest wheel built for ``source``, or to the one
+        with hash ``digest`` when it is given. None when there is none
+        or it is corrupt."""
+        wheels = self.wheels(requirement(source))
+        if digest is not None:
+            wheels = [w for w in wheels if w[0] == digest]
+        return wheels and wheels[-1][1] or None
+
+    def digest(self, filename):
+        """sha256 of a wheel from its manifest, None when it is corrupt."""
+        return CacheManifest(filename).verify()['root']
+
+    def add(self, req, filename, name=None):
+        """Copies ``filename`` into the wheelhouse as the latest wheel of ``req``.
+
+        Returns its path.
+        """
+        name = name or os.path.basename(filename)
+        sha256 = file_digest(filename)
+        relative = '%s/%s' % (sha256[:16], name)
+        target = j(self.path, sha256[:16], name)
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        CacheManifest(target).remove()
+        shutil.copyfile(filename, target)
+        self.index[req] = [w for w in self.index.get(req, []) if w[0] != sha256] + [[sha256, relative]]
+        return target
+
+    def url(self, source, digest=None):
+        """file:// url of the wheel of ``source`` carrying its hash, which pip
+        records in the installed dist-info for ``InstalledIndex``.
+
+        Raises ValueError when ``digest`` is given and no wheel has it.
+        """
+        import urllib
+        wheel = self.wheel(source, digest)
+        if wheel is None:
+            built = self.wheel(source)
+            raise ValueError("the wheel of %s doesn't match the locked sha256 %s%s, "
+                             "wheel builds aren't reproducible: restore the locked wheel "
+                             "(lazypony cache import) or resolve again without the lockfile" % (
+                             requirement(source), digest, built and ", built %s" % self.digest(built) or ""))
+        return 'file:%s#sha256=%s' % (urllib.pathname2url(os.path.abspath(wheel)), self.digest(wheel))
+
+    def missing(self, sources, digests={}):
+        return [s for s in sources
+                if self.wheel(s, digests.get(requirement(s))) is None]
+
+    def build_jobs(self, sources, pip='pip', timeout=None, digests={}, trees={}, depends={}):
+        """Jobs building a wheel for every source not in the wheelhouse yet.
+
+        Each build gets its own directory so results can be told apart
+        when the jobs run concurrently; ``collect`` moves them in place as
+        soon as a job finishes.
+        ``digests`` maps requirement lines to expected wheel hashes,
+        ``trees`` to fetched source trees which are built instead of the
+        requirement and ``depends`` to names of jobs fetching them.
+        """
+        jobs = []
+        for source in self.missing(sources, digests):
+            out = j(self.build_dir, source[2])
+            shutil.rmtree(out, True)
+            os.makedirs(out)
+            req = requirement(source)
+            job = Job('wheel:%s' % source[2],
+                      [pip, 'wheel', '--no-deps', '-w', out, trees.get(req, req)],
+                      depends=depends.get(req, ()), timeout=timeout,
+                      callback=self.collect)
+            job.source = source
+            job.wheel_dir = out
+            jobs.append(job)
+        return jobs
+
+    def collect(self, job):
+        """Moves the wheel of a successful build job into the wheelhouse."""
+        if job.ok:
+            for name in os.listdir(job.wheel_dir):
+                if name.endswith('.whl'):
+                    self.add(requirement(job.source), j(job.wheel_dir, name))
+            self.save()
+        shutil.rmtree(job.wheel_dir, True)
+
+    def install_job(self, pip, source, depends=(), timeout=None, digest=None):
+        """Job installing the wheel of ``source`` without touching anything else.
+
+        The wheel path is looked up when the job starts, so it may depend
+        on the job building it. With ``digest`` the job fails unless the
+        wheel with that hash is there.
+        """
+        return Job('install:%s' % source[2],
+                   lambda: [pip, 'install', '-q', '--no-index', '--find-links', self.path,
+                            '--no-deps', self.url(source, digest)],
+                   depends=depends, timeout=timeout)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""lazypony as a single executable zip file
+
+    python lazypony.pyz -p
+
+The archive holds the command line as ``lazypony``, ``libs`` as bytecode
+only (compiled by the interpreter building it, which is the one it has to
+run with), the catalog index as ``libs/catalog.json`` and ``res`` and
+``packages`` as plain files. ``__main__`` runs informational commands right
+from the archive; the others need ``res`` and ``packages`` on disk, they are
+extracted once per build into ``<cache>/app/<build id>`` and used from
+there.
+"""
+import os
+import imp
+import json
+import time
+import marshal
+import shutil
+import zipfile
+import hashlib
+from os.path import join as j
+
+__all__ = ['BUILD', 'DATA', 'build', 'extract']
+
+# Build id of the archive, next to this module
+BUILD = 'build.json'
+
+# Directories extracted for the commands which read them
+DATA = ('res', 'packages')
+
+# Modules kept as source, they are read rather than imported
+SOURCES = (j('libs', 'importtrace.py'),)
+
+BOOTSTRAP = '''# -*- coding: utf-8 -*-
+import os
+import sys
+import runpy
+
+INFORMATIONAL = set(['-h', '--help', '-v', '--version', '-p', '--show-packages', 'history', 'submit'])
+
+if 'LAZYPONY_ROOT' not in os.environ and not INFORMATIONAL & set(sys.argv[1:2] + [a for a in sys.argv[1:] if a.startswith('-')]):
+    from libs import settings
+    from libs.zipapp import extract
+    os.environ['LAZYPONY_ROOT'] = settings.ROOT = extract(sys.path[0], settings.CACHE_ROOT)
+runpy.run_module('lazypony', run_name='__main__', alter_sys=True)
+'''
+
+
+def _bytecode(source, filename):
+    """Contents of the ``.pyc`` of ``source``.
+
+    Without a source next to it zipimport never compares the timestamp.
+    """
+    code = compile(source, filename, 'exec')
+    return imp.get_magic() + '\0\0\0\0' + marshal.dumps(code)
+
+
+def _write(archive, name, data):
+    info = zipfile.ZipInfo(name.replace(os.sep, '/'), time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0644 << 16
+    archive.writestr(info, data)
+
+
+def build(root, target, catalog_entries):
+    """Writes the zipapp of the lazypony in ``root`` to ``target``.
+
+    ``catalog_entries`` are embedded as the catalog index. Returns the
+    build id, a hash over everything in the archive.
+    """
+    members = {'__main__.py': BOOTSTRAP}
+    members['lazypony.pyc'] = _bytecode(open(j(root, '__init__.py')).read(), 'lazypony.py')
+    for base, dirs, files in os.walk(j(root, 'libs')):
+        for name in files:
+            filename = j(base, name)
+            relative = os.path.relpath(filename, root)
+            if relative in SOURCES:
+                members[relative] = open(filename, 'rb').read()
+            elif name.endswith('.py'):
+                members[relative + 'c'] = _bytecode(open(filename).read(), relative)
+    for directory in DATA:
+        for base, dirs, files in os.walk(j(root, directory)):
+            for name in files:
+                if not name.endswith(('.pyc', '.pyo')):
+                    filename = j(base, name)
+                    members[os.path.relpath(filename, root)] = open(filename, 'rb').read()
+    members[j('libs', 'catalog.json')] = json.dumps(catalog_entries, sort_keys=True)
+
+    digest = hashlib.sha1()
+    for name, data in sorted(members.items()):
+        digest.update("%s %s\n" % (hashlib.sha1(data).hexdigest(), name))
+    members[j('libs', BUILD)] = json.dumps({'id': digest.hexdigest()[:16]})
+
+    directory = os.path.dirname(os.path.abspath(target))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    file = open(target + '.part', 'wb')
+    try:
+        file.write('#!/usr/bin/env python2\n')
+        archive = zipfile.ZipFile(file, 'w')
+        for name, data in sorted(members.items()):
+            _write(archive, name, data)
+        archive.close()
+    finally:
+        file.close()
+    os.chmod(target + '.part', 0755)
+    os.rename(target + '.part', target)
+    return digest.hexdigest()[:16]
+
+
+def extract(path, cache_root):
+    """Directory holding ``DATA`` of the zipapp at ``path``, extracted once per build."""
+    archive = zipfile.ZipFile(path)
+    try:
+        build_id = json.loads(archive.read('libs/%s' % BUILD))['id']
+        target = j(cache_root, 'app', build_id)
+        if os.path.isdir(target):
+            return target
+        part = '%s.part.%s' % (target, os.getpid())
+        for name in archive.namelist():
+            if name.split('/', 1)[0] in DATA:
+                archive.extract(name, part)
+    finally:
+        archive.close()
+    try:
+        os.rename(part, target)
+    except OSError:
+        # extracted by another run meanwhile
+        shutil.rmtree(part, True)
+    return target
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Full-page and per-view caching with django's own cache middleware"""
+
+# UpdateCacheMiddleware runs last on the response so it caches what every
+# other middleware made of it, FetchFromCacheMiddleware runs last on the
+# request so the ones before it (sessions, auth) still see every request
+FIRST = ('django.middleware.cache.UpdateCacheMiddleware',)
+LAST = ('django.middleware.cache.FetchFromCacheMiddleware',)
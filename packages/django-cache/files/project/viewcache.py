@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Per-view caching
+
+    from viewcache import cache_view
+
+    @cache_view(60 * 15)
+    def article(request, slug):
+        ...
+
+Like ``cache_page``, but only anonymous visitors are served from the cache,
+signed in users always get the view itself.
+"""
+from django.conf import settings
+from django.middleware.cache import CacheMiddleware
+from django.utils.decorators import decorator_from_middleware_with_args
+from django.utils.functional import wraps
+
+
+def cache_view(timeout=None, key_prefix=None):
+    """Caches the responses of the decorated view for ``timeout`` seconds,
+    CACHE_MIDDLEWARE_SECONDS by default."""
+    if timeout is None:
+        timeout = settings.CACHE_MIDDLEWARE_SECONDS
+    cache = decorator_from_middleware_with_args(CacheMiddleware)
+    def decorator(view):
+        cached = cache(cache_timeout=timeout, key_prefix=key_prefix)(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated():
+                return view(request, *args, **kwargs)
+            return cached(request, *args, **kwargs)
+        return wraps(view)(wrapper)
+    return decorator
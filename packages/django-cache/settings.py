@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+MIDDLEWARE_CLASSES = (
+    'django.middleware.cache.UpdateCacheMiddleware',
+    'django.middleware.cache.FetchFromCacheMiddleware',
+)
+
+if PRODUCTION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': '127.0.0.1:11211',
+            'TIMEOUT': 600,
+        },
+    }
+    CACHE_BACKEND = 'memcached://127.0.0.1:11211/?timeout=600'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+    CACHE_BACKEND = 'locmem://'
+
+# Whole pages are cached for anonymous visitors only
+CACHE_MIDDLEWARE_SECONDS = 600
+CACHE_MIDDLEWARE_KEY_PREFIX = 'project'
+CACHE_MIDDLEWARE_ANONYMOUS_ONLY = True
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# Part of django itself, nothing to fetch or install
+SOURCE = None
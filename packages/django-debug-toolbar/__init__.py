@@ -1,2 +1,13 @@
 __author__="PyKaB"
-__date__ ="$16.08.2010 12:33:58$"
\ No newline at end of file
+__date__ ="$16.08.2010 12:33:58$"
+
+ORDER = {
+    # shows the response before it is encoded
+    'debug_toolbar.middleware.DebugToolbarMiddleware': {
+        'after': ('django.middleware.gzip.GZipMiddleware',),
+        'cost': 3,
+    },
+}
+
+# Only useful while developing, left out of the test settings
+DEV_ONLY = True
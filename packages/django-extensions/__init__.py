@@ -1,2 +1,5 @@
 __author__="PyKaB"
-__date__ ="$16.08.2010 12:30:37$"
\ No newline at end of file
+__date__ ="$16.08.2010 12:30:37$"
+
+# Only useful while developing, left out of the test settings
+DEV_ONLY = True
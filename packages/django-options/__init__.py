@@ -1,2 +1,9 @@
 __author__="PyKaB"
-__date__ ="$16.08.2010 12:33:35$"
\ No newline at end of file
+__date__ ="$16.08.2010 12:33:35$"
+
+ORDER = {
+    # queries the options on every RequestContext
+    'options.context_processors.options': {
+        'cost': 10,
+    },
+}
@@ -1,2 +1,33 @@
 __author__="PyKaB"
-__date__ ="$16.08.2010 12:29:27$"
\ No newline at end of file
+__date__ ="$16.08.2010 12:29:27$"
+
+SESSION = 'django.contrib.sessions.middleware.SessionMiddleware'
+
+# Middleware order constraints and relative cost per request, see libs/merge.py
+ORDER = {
+    # answers redirects and forbidden user agents without touching anything else
+    'django.middleware.common.CommonMiddleware': {
+        'cost': 1,
+    },
+    SESSION: {
+        'cost': 2,
+    },
+    'django.middleware.locale.LocaleMiddleware': {
+        # reads the language from the session, and CommonMiddleware's
+        # redirects have to be in the right language
+        'after': (SESSION,),
+        'before': ('django.middleware.common.CommonMiddleware',),
+        'cost': 2,
+    },
+    'django.contrib.auth.middleware.AuthenticationMiddleware': {
+        'after': (SESSION,),
+    },
+    'django.contrib.messages.middleware.MessageMiddleware': {
+        'after': (SESSION,),
+    },
+    'django.middleware.gzip.GZipMiddleware': {
+        # compresses what every other middleware made of the response
+        'before': ('django.middleware.common.CommonMiddleware',),
+        'cost': 3,
+    },
+}
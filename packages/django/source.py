@@ -9,4 +9,10 @@ SOURCE = (
     'http://code.djangoproject.com/svn/django/trunk/',
     'django-trunk',
     13596
+)
+
+# Only what setup.py needs, trunk tests and docs are not fetched
+SPARSE = (
+    'setup.py',
+    'django',
 )
\ No newline at end of file
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""concurrent.futures backport for python 2, used by gunicorn's gthread workers"""
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+SOURCE = (
+    'git',
+    'https://github.com/agronholm/pythonfutures.git',
+    'futures',
+    '3.3.0'
+)
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Application server the generated project/conf/platform/gunicorn.py is for
+
+Installed into every project, see ``REQUIRED`` in libs/scaffold.py.
+"""
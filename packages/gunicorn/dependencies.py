@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# The gthread workers need concurrent.futures, a backport on python 2
+DEPENDENCIES = (
+    'futures',
+)
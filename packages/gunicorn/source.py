@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+# 19.10 is the last release running on python 2, the config needs gthread
+# workers and max_requests_jitter (19.2+)
+SOURCE = (
+    'git',
+    'https://github.com/benoitc/gunicorn.git',
+    'gunicorn',
+    '19.10.0'
+)
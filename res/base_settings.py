@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 
 ADMINS = (
     # ('Your Name', 'your_email@domain.com'),
@@ -17,8 +18,8 @@ except ImportError:
 
 TEMPLATE_DEBUG = DEBUG
 
-TIME_ZONE = 'Europe/Moscow' # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
-LANGUAGE_CODE = 'en-us' # http://www.i18nguy.com/unicode/language-identifiers.html
+TIME_ZONE = '{{ time_zone }}' # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
+LANGUAGE_CODE = '{{ language_code }}' # http://www.i18nguy.com/unicode/language-identifiers.html
 SITE_ID = 1
 USE_I18N = True
 USE_L10N = True
@@ -35,26 +36,20 @@ TEMPLATE_LOADERS = (
     'django.template.loaders.app_directories.Loader',
 )
 
-MIDDLEWARE_CLASSES = (
-    'django.middleware.common.CommonMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-)
-
 ROOT_URLCONF = '{{ project_name }}.urls'
 
 TEMPLATE_DIRS = (
     DOCUMENT_ROOT+'app/templates/',
 )
 
-INSTALLED_APPS = (
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.sites',
-    'django.contrib.messages',
-    # Uncomment the next line to enable the admin:
-    # 'django.contrib.admin',
-)
+# Package settings copied from the catalog, executed in install order
+PRODUCTION = not DEBUG
+for package in {{ packages }}:
+    execfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'conf', 'packages', '%s.py' % package))
+
+# Merged from the settings of every installed package
+MIDDLEWARE_CLASSES = {{ middleware_classes }}
+
+TEMPLATE_CONTEXT_PROCESSORS = {{ template_context_processors }}
+
+INSTALLED_APPS = {{ installed_apps }}
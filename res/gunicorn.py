@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Prefork application server config, sized to the host it starts on
+
+Run from the project root:
+
+    env/bin/gunicorn -c project/conf/platform/gunicorn.py wsgi:application
+"""
+import os
+import multiprocessing
+
+# Resident memory of one worker, and memory left to everything else
+WORKER_MEMORY = 128 * 1024 * 1024
+RESERVED_MEMORY = 256 * 1024 * 1024
+
+
+def memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def size(cpus, memory):
+    """Workers and threads per worker for ``cpus`` and ``memory`` bytes.
+
+    2 * cpus + 1 workers as long as they fit in memory, when they don't the
+    workers that fit get threads to make up for the missing ones.
+    """
+    wanted = 2 * cpus + 1
+    workers = wanted
+    if memory:
+        workers = max(1, min(wanted, (memory - RESERVED_MEMORY) // WORKER_MEMORY))
+    threads = min(4, (wanted + workers - 1) // workers)
+    return workers, threads
+
+
+workers, threads = size(multiprocessing.cpu_count(), memory())
+workers = int(os.environ.get('WEB_WORKERS', workers))
+threads = int(os.environ.get('WEB_THREADS', threads))
+worker_class = threads > 1 and 'gthread' or 'sync'
+
+bind = os.environ.get('WEB_BIND', '127.0.0.1:8000')
+chdir = '{{ document_root }}{{ project_name }}'
+
+# Settings, django and the apps are imported once in the master and shared
+# copy-on-write by the forked workers
+preload_app = True
+
+# Workers are recycled to bound leaks, jitter keeps them from restarting at once
+max_requests = 1000
+max_requests_jitter = 100
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 2
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Settings for running the tests, fast rather than production-like
+
+    python manage.py test --settings=settings_test
+"""
+from settings import *
+
+DEBUG = False
+TEMPLATE_DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+# Build the test database from the models instead of running every migration
+SOUTH_TESTS_MIGRATE = False
+SKIP_SOUTH_TESTS = True
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+CACHE_BACKEND = 'locmem://'
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+
+# The settings of the installed packages without the development-only ones
+# and without whole-page caching
+MIDDLEWARE_CLASSES = {{ middleware_classes }}
+
+TEMPLATE_CONTEXT_PROCESSORS = {{ template_context_processors }}
+
+INSTALLED_APPS = {{ installed_apps }}
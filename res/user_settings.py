@@ -2,15 +2,6 @@
 DEBUG = {{ debug }}
 STATIC_SERV = {{ static_serve }}
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends',
-        'NAME': '',
-        'USER': '',
-        'PASSWORD': '',
-        'HOST': '',
-        'PORT': '',
-    }
-}
+DATABASES = {{ databases }}
 
 SITE_HTTP = '{{ site_http }}'
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""WSGI entry point
+
+    env/bin/gunicorn -c project/conf/platform/gunicorn.py wsgi:application
+"""
+import os
+import sys
+
+DOCUMENT_ROOT = '{{ document_root }}'
+
+for path in (DOCUMENT_ROOT, DOCUMENT_ROOT+'{{ project_name }}'):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+from django.core.handlers.wsgi import WSGIHandler
+application = WSGIHandler()